@@ -117,6 +117,14 @@ class CommandLine(object):
         """
         self._renderer.render(self._line.get_render_context())
 
+    def _on_resize(self):
+        """
+        When the window size changes, we have to know the new width, and
+        render again.
+        """
+        self._renderer.reset_size()
+        self._redraw()
+
     def on_input_timeout(self, code_obj):
         """
         Called when there is no input for x seconds.
@@ -179,10 +187,13 @@ class CommandLine(object):
             self._line.reset(initial_value=initial_value)
 
         with raw_mode(self.stdin):
+            # The terminal could have been resized since the previous input.
+            self._renderer.reset_size()
+
             reset_line()
             self._redraw()
 
-            with call_on_sigwinch(self._redraw):
+            with call_on_sigwinch(self._on_resize):
                 while True:
                     if self.enable_concurency:
                         c = self._get_char_loop()
@@ -24,7 +24,9 @@ from prompt_toolkit.line import Exit, Line
 from prompt_toolkit.prompt import Prompt
 
 from six import exec_
+from six.moves import builtins
 
+import ast
 import jedi
 import os
 import re
@@ -35,6 +37,17 @@ import threading
 __all__ = ('PythonCommandLine', 'embed')
 
 
+# Opening brackets, mapped to the closing bracket that they expect.
+_OPENING_BRACKETS = {'(': ')', '[': ']', '{': '}'}
+_CLOSING_BRACKETS = frozenset(')]}')
+
+# Characters that start (and end) a string literal.
+_QUOTES = frozenset('\'"')
+
+# Indentation at the start of a line.
+_LEADING_WHITESPACE_RE = re.compile(r'\s*', re.UNICODE)
+
+
 class PythonStyle(Style):
     background_color = None
     styles = {
@@ -85,6 +98,8 @@ class _PythonInputStreamHandlerMixin(object):
     """
     Extensions to the input stream handler for custom 'enter' behaviour.
     """
+    __slots__ = ()
+
     def F6(self):
         """ Enable/Disable paste mode. """
         self._line.paste_mode = not self._line.paste_mode
@@ -134,11 +149,11 @@ class _PythonInputStreamHandlerMixin(object):
 
 
 class PythonViInputStreamHandler(_PythonInputStreamHandlerMixin, ViInputStreamHandler):
-    pass
+    __slots__ = ()
 
 
 class PythonEmacsInputStreamHandler(_PythonInputStreamHandlerMixin, EmacsInputStreamHandler):
-    pass
+    __slots__ = ()
 
 
 class PythonLine(Line):
@@ -159,6 +174,9 @@ class PythonLine(Line):
         # Code signatures. (This is set asynchronously after a timeout.)
         self.signatures = []
 
+        # (text, result) tuple of the last `_has_unclosed_brackets` call.
+        self._unclosed_brackets_cache = (None, False)
+
     def _text_changed(self):
         self.is_multiline = '\n' in self.text
 
@@ -166,29 +184,73 @@ class PythonLine(Line):
         return self.document.text_before_cursor[-1:] == ':'
 
     def _has_unclosed_brackets(self):
-        """ Starting at the end of the string. If we find an opening bracket
-        for which we didn't had a closing one yet, return True. """
+        """ Return True when the text before the cursor contains an opening
+        bracket for which we didn't had a closing one yet. """
         text = self.document.text_before_cursor
-        stack = []
 
-        # Ignore braces inside strings
-        text = re.sub(r'''('[^']*'|"[^"]*")''', '', text) # XXX: handle escaped quotes.!
+        # Don't scan the same text twice. (Enter can be pressed several times
+        # on the same input, and the input can be very long in paste mode.)
+        cached_text, cached_result = self._unclosed_brackets_cache
+        if text == cached_text:
+            return cached_result
 
-        for c in reversed(text):
-            if c in '])}':
-                stack.append(c)
+        result = self._scan_unclosed_brackets(text)
+        self._unclosed_brackets_cache = (text, result)
+        return result
+
+    def _scan_unclosed_brackets(self, text):
+        """ Single forward pass over the text. Brackets inside string literals
+        are ignored. (Backslash escapes inside strings are taken into
+        account. Only triple quoted strings can span several lines.)
+
+        A closing bracket that doesn't match the innermost opening bracket
+        makes the input invalid up to that point, so everything that was still
+        open is considered closed. (Enter will then execute the input and show
+        the SyntaxError.) """
+        # Without opening brackets, there is nothing to scan.
+        if not ('(' in text or '[' in text or '{' in text):
+            return False
+
+        stack = [] # Closing brackets that we expect, innermost last.
+        quote = None # The quote (one or three characters) of the string we're in.
+        i = 0
+        length = len(text)
+
+        while i < length:
+            c = text[i]
+
+            if quote:
+                if c == '\\':
+                    # Skip the escaped character.
+                    i += 1
+                elif len(quote) == 3:
+                    if text.startswith(quote, i):
+                        quote = None
+                        i += 2
+                elif c == quote or c == '\n':
+                    quote = None
+
+            elif c in _QUOTES:
+                if text.startswith(c * 3, i):
+                    quote = c * 3
+                    i += 2
+                else:
+                    quote = c
 
-            elif c in '[({':
+            elif c in _OPENING_BRACKETS:
+                stack.append(_OPENING_BRACKETS[c])
+
+            elif c in _CLOSING_BRACKETS:
                 if stack:
-                    if ((c == '[' and stack[-1] == ']') or
-                        (c == '{' and stack[-1] == '}') or
-                        (c == '(' and stack[-1] == ')')):
+                    if stack[-1] == c:
                         stack.pop()
-                else:
-                    # Opening bracket for which we didn't had a closing one.
-                    return True
+                    else:
+                        # Mismatched closing bracket.
+                        del stack[:]
+
+            i += 1
 
-        return False
+        return bool(stack)
 
     def newline(self):
         r"""
@@ -201,21 +263,18 @@ class PythonLine(Line):
         else:
             # Go to new line, but also add indentation.
             current_line = self.document.current_line_before_cursor.rstrip()
-            insert_text('\n')
 
-            # Copy whitespace from current line
-            for c in current_line:
-                if c.isspace():
-                    insert_text(c)
-                else:
-                    break
+            # Copy whitespace from current line. (Matching only the indentation
+            # doesn't copy the rest of the line, like lstrip() does.)
+            indent = _LEADING_WHITESPACE_RE.match(current_line).group(0)
 
             # If the last line ends with a colon, add four extra spaces.
             if current_line[-1:] == ':':
-                for x in range(4):
-                    insert_text(' ')
+                indent += '    '
+
+            insert_text('\n' + indent)
 
-    def cursor_left(self):
+    def cursor_left(self, count=1):
         """
         When moving the cursor left in the left indentation margin, move four
         spaces at a time.
@@ -223,14 +282,11 @@ class PythonLine(Line):
         before_cursor = self.document.current_line_before_cursor
 
         if not self.paste_mode and not self.mode == LineMode.INCREMENTAL_SEARCH and before_cursor.isspace():
-            count = 1 + (len(before_cursor) - 1) % 4
-        else:
-            count = 1
+            count = 1 + (len(before_cursor) - 1) % 4 + 4 * (count - 1)
 
-        for i in range(count):
-            super(PythonLine, self).cursor_left()
+        super(PythonLine, self).cursor_left(count)
 
-    def cursor_right(self):
+    def cursor_right(self, count=1):
         """
         When moving the cursor right in the left indentation margin, move four
         spaces at a time.
@@ -243,12 +299,16 @@ class PythonLine(Line):
 
         if (not self.paste_mode and not self.mode == LineMode.INCREMENTAL_SEARCH and
                     (not before_cursor or before_cursor.isspace()) and after_cursor_space_count):
-            count = min(4, after_cursor_space_count)
-        else:
-            count = 1
+            # Steps of four spaces through the whitespace, single characters
+            # after that.
+            steps = (after_cursor_space_count + 3) // 4
 
-        for i in range(count):
-            super(PythonLine, self).cursor_right()
+            if count <= steps:
+                count = min(4 * count, after_cursor_space_count)
+            else:
+                count = after_cursor_space_count + count - steps
+
+        super(PythonLine, self).cursor_right(count)
 
 
 class PythonPrompt(Prompt):
@@ -304,13 +364,14 @@ class PythonPrompt(Prompt):
             append((Signature.Operator, '('))
 
             for i, p in enumerate(sig.params):
+                if i:
+                    append((Signature.Operator, ', '))
+
                 if i == sig.index:
                     append((Signature.CurrentName, str(p.name)))
                 else:
                     append((Signature, str(p.name)))
-                append((Signature.Operator, ', '))
 
-            result.pop() # Pop last comma
             append((Signature.Operator, ')'))
 
         return result
@@ -326,53 +387,78 @@ class PythonPrompt(Prompt):
             return []
 
     def _get_toolbar_tokens(self):
+        # The toolbar only changes when one of these changes.
+        handler = self._pythonline._inputstream_handler
+        state = (
+            self.line.mode,
+            self._pythonline.vi_mode,
+            getattr(handler, '_vi_mode', None),
+            getattr(handler, 'is_recording_macro', False),
+            self.line._working_index,
+            len(self.line._working_lines),
+            self.line.paste_mode,
+            self.line.is_multiline)
+
+        # (A new `PythonPrompt` is created for every redraw, so the cache is
+        # stored in the `PythonCommandLine`.)
+        cached_state, tokens = self._pythonline._toolbar_cache
+        if state != cached_state:
+            tokens = self._create_toolbar_tokens()
+            self._pythonline._toolbar_cache = (state, tokens)
+
+        return tokens
+
+    def _create_toolbar_tokens(self):
         result = []
         append = result.append
         TB = Token.Toolbar
+        TB_Mode = TB.Mode
+        TB_On = TB.On
+        TB_Off = TB.Off
 
         append((Token, '\n  '))
         append((TB, '  '))
 
         # Mode
         if self.line.mode == LineMode.INCREMENTAL_SEARCH:
-            append((TB.Mode, '(SEARCH)'))
+            append((TB_Mode, '(SEARCH)'))
             append((TB, '  '))
         elif self._pythonline.vi_mode:
             mode = self._pythonline._inputstream_handler._vi_mode
             if mode == ViMode.NAVIGATION:
-                append((TB.Mode, '(NAV)'))
+                append((TB_Mode, '(NAV)'))
                 append((TB, '     '))
             elif mode == ViMode.INSERT:
-                append((TB.Mode, '(INSERT)'))
+                append((TB_Mode, '(INSERT)'))
                 append((TB, '  '))
             elif mode == ViMode.REPLACE:
-                append((TB.Mode, '(REPLACE)'))
+                append((TB_Mode, '(REPLACE)'))
                 append((TB, ' '))
 
             if self._pythonline._inputstream_handler.is_recording_macro:
-                append((TB.Mode, 'recording'))
+                append((TB_Mode, 'recording'))
                 append((TB, ' '))
 
         else:
-            append((TB.Mode, '(emacs)'))
+            append((TB_Mode, '(emacs)'))
             append((TB, ' '))
 
         # Position in history.
-        result.append((TB, '%i/%i ' % (self.line._working_index + 1, len(self.line._working_lines))))
+        append((TB, '%i/%i ' % (self.line._working_index + 1, len(self.line._working_lines))))
 
         # Shortcuts.
         if self.line.mode == LineMode.INCREMENTAL_SEARCH:
             append((TB, '[Ctrl-G] Cancel search'))
         else:
             if self.line.paste_mode:
-                append((TB.On, '[F6] Paste mode (on)  '))
+                append((TB_On, '[F6] Paste mode (on)  '))
             else:
-                append((TB.Off, '[F6] Paste mode (off) '))
+                append((TB_Off, '[F6] Paste mode (off) '))
 
             if self.line.is_multiline:
-                append((TB.On, '[F7] Multiline (on)  '))
+                append((TB_On, '[F7] Multiline (on)  '))
             else:
-                append((TB.Off, '[F7] Multiline (off) '))
+                append((TB_Off, '[F7] Multiline (off) '))
 
             if self.line.is_multiline:
                 append((TB, '[Meta+Enter] Execute'))
@@ -387,9 +473,24 @@ class PythonPrompt(Prompt):
 class PythonCode(Code):
     lexer_cls = PythonLexer
 
-    def __init__(self, document, globals, locals):
+    #: ((lexer class, text), tokens) tuple of the last tokenized input. A new
+    #: `PythonCode` instance is created for every key press, also when only
+    #: the cursor moves, so this is shared between all instances. (And
+    #: subclasses, which can have another lexer.)
+    _tokens_cache = (None, None)
+
+    #: (jedi script, completions) tuple of the last completion request.
+    #: (Tab asks for the completions of the same input several times.)
+    _completions_cache = (None, None)
+
+    def __init__(self, document, globals, locals, jedi_cache=None):
         self._globals = globals
         self._locals = locals
+
+        #: Dictionary, shared between `PythonCode` instances, which maps
+        #: (text, row, column) tuples to jedi scripts.
+        self._jedi_cache = {} if jedi_cache is None else jedi_cache
+
         super(PythonCode, self).__init__(document)
 
     def validate(self):
@@ -402,21 +503,26 @@ class PythonCode(Code):
     def _get_tokens(self):
         """ Overwrite parent function, to change token types of non-matching
         brackets to Token.Error for highlighting. """
+        key = (self.lexer_cls, self.text)
+
+        cached_key, tokens = PythonCode._tokens_cache
+        if cached_key == key:
+            return tokens
+
         result = super(PythonCode, self)._get_tokens()
 
-        stack = [] # Pointers to the result array
+        stack = [] # (index in the result array, expected closing bracket)
 
         for index, (token, text) in enumerate(result):
-            top = result[stack[-1]][1] if stack else ''
+            if len(text) != 1:
+                continue
 
-            if text in '({[]})':
-                if text in '({[':
-                    # Put open bracket on the stack
-                    stack.append(index)
+            if text in _OPENING_BRACKETS:
+                # Put open bracket on the stack
+                stack.append((index, _OPENING_BRACKETS[text]))
 
-                elif (text == ')' and top == '(' or
-                      text == '}' and top == '{' or
-                      text == ']' and top == '['):
+            elif text in _CLOSING_BRACKETS:
+                if stack and stack[-1][1] == text:
                     # Match found
                     stack.pop()
                 else:
@@ -424,12 +530,34 @@ class PythonCode(Code):
                     result[index] = (Token.Error, text)
 
         # Highlight unclosed tags that are still on the stack.
-        for index in stack:
+        for index, _ in stack:
             result[index] = (Token.Error, result[index][1])
 
+        PythonCode._tokens_cache = (key, result)
         return result
 
     def _get_jedi_script(self):
+        """
+        Return the jedi script for the current text and cursor position.
+        (This is requested for every completion request, so it's cached. Only
+        use it from the main thread.)
+        """
+        key = (self.text, self.document.cursor_position_row,
+               self.document.cursor_position_col)
+
+        try:
+            return self._jedi_cache[key]
+        except KeyError:
+            script = self._create_jedi_script()
+
+            # Keep the cache small.
+            if len(self._jedi_cache) >= 8:
+                self._jedi_cache.clear()
+
+            self._jedi_cache[key] = script
+            return script
+
+    def _create_jedi_script(self):
         try:
             return jedi.Interpreter(self.text,
                     column=self.document.cursor_position_col,
@@ -450,8 +578,16 @@ class PythonCode(Code):
         script = self._get_jedi_script()
 
         if script:
-            for c in script.completions():
-                yield Completion(c.name, c.complete)
+            # The script is cached per input and cursor position, and replaced
+            # when the namespace changes, so it's a valid cache key.
+            cached_script, completions = PythonCode._completions_cache
+
+            if script is not cached_script:
+                completions = [Completion(c.name, c.complete) for c in script.completions()]
+                PythonCode._completions_cache = (script, completions)
+
+            for c in completions:
+                yield c
 
 
 class PythonCommandLine(CommandLine):
@@ -474,7 +610,10 @@ class PythonCommandLine(CommandLine):
 
     def __init__(self, globals=None, locals=None, vi_mode=False, stdin=None, stdout=None, history_filename=None, style_cls=PythonStyle):
         self.globals = globals or {}
-        self.globals.update({ k: getattr(__builtins__, k) for k in dir(__builtins__) })
+        # Make the builtins available, without copying them into the globals.
+        # (`__builtins__` can be a dictionary instead of the module when
+        # `globals` were taken from a module other than `__main__`.)
+        self.globals.setdefault('__builtins__', builtins)
         self.locals = locals or {}
         self.history_filename = history_filename
         self.style_cls = style_cls
@@ -487,7 +626,22 @@ class PythonCommandLine(CommandLine):
 
         # The `PythonCode` needs a reference back to this class in order to do
         # autocompletion on the globals/locals.
-        self.code_cls = lambda document: PythonCode(document, self.globals, self.locals)
+        self.code_cls = lambda document: PythonCode(document, self.globals, self.locals, self._jedi_cache)
+
+        # Jedi scripts, shared by all the `PythonCode` instances. This has to
+        # be cleared when the namespace changes.
+        self._jedi_cache = {}
+
+        # Signatures for (text, cursor row, cursor column), computed by the
+        # get-signature thread. Cleared together with the Jedi cache.
+        self._signatures_cache = {}
+
+        # (state, tokens) tuple of the last toolbar. (See `PythonPrompt`.)
+        self._toolbar_cache = (None, None)
+
+        # Lexer and formatter for highlighting tracebacks.
+        self._tb_lexer = PythonTracebackLexer()
+        self._tb_formatter = Terminal256Formatter()
 
         # The `PythonPrompt` class needs a reference back in order to show the
         # input method.
@@ -500,6 +654,16 @@ class PythonCommandLine(CommandLine):
         When there is no input activity,
         in another thread, get the signature of the current code.
         """
+        key = (code_obj.text, code_obj.document.cursor_position_row,
+               code_obj.document.cursor_position_col)
+
+        # When we computed the signatures for this input before, show them
+        # without starting a thread.
+        if key in self._signatures_cache:
+            self._line.signatures = self._signatures_cache[key]
+            self.request_redraw()
+            return
+
         # Never run multiple get-signature threads.
         if self.get_signatures_thread_running:
             return
@@ -507,7 +671,10 @@ class PythonCommandLine(CommandLine):
 
         class GetSignatureThread(threading.Thread):
             def run(t):
-                script = code_obj._get_jedi_script()
+                # Jedi is not thread safe, so don't use the cached script,
+                # which is used for completion in the main thread. Only the
+                # signatures are cached.
+                script = code_obj._create_jedi_script()
 
                 # Show signatures in help text.
                 if script:
@@ -519,6 +686,10 @@ class PythonCommandLine(CommandLine):
                 else:
                     signatures = []
 
+                if len(self._signatures_cache) >= 8:
+                    self._signatures_cache.clear()
+                self._signatures_cache[key] = signatures
+
                 self.get_signatures_thread_running = False
 
                 # Set signatures and redraw if the text didn't change in the
@@ -552,6 +723,10 @@ class PythonCommandLine(CommandLine):
                     except Exception as e:
                         self._handle_exception(e)
 
+                    # The statement can have changed the globals/locals.
+                    self._jedi_cache.clear()
+                    self._signatures_cache.clear()
+
                     self.current_statement_index += 1
         except Exit:
             pass
@@ -564,21 +739,26 @@ class PythonCommandLine(CommandLine):
             # Run as shell command
             os.system(line[1:])
         else:
-            # Try eval first
-            try:
-                result = eval(line, self.globals, self.locals)
+            # Parse only once. (Like `eval`, ignore leading whitespace.)
+            tree = compile(line.lstrip(' \t'), '<input>', 'exec', ast.PyCF_ONLY_AST)
+
+            # When the input is a single expression, eval and print the result.
+            if len(tree.body) == 1 and isinstance(tree.body[0], ast.Expr):
+                expression = ast.Expression(tree.body[0].value)
+                result = eval(compile(expression, '<input>', 'eval'), self.globals, self.locals)
+
                 self.locals['_'] = self.locals['_%i' % self.current_statement_index] = result
                 if result is not None:
                     print('Out[%i]: %r' % (self.current_statement_index, result))
-            # If not a valid `eval` expression, run using `exec` instead.
-            except SyntaxError:
-                exec_(line, self.globals, self.locals)
+            # Otherwise, run using `exec`.
+            else:
+                exec_(compile(tree, '<input>', 'exec'), self.globals, self.locals)
 
             print()
 
     def _handle_exception(self, e):
         tb = traceback.format_exc()
-        print(highlight(tb, PythonTracebackLexer(), Terminal256Formatter()))
+        print(highlight(tb, self._tb_lexer, self._tb_formatter))
         print(e)
 
     def _handle_keyboard_interrupt(self, e):
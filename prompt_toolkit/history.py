@@ -1,19 +1,31 @@
 from __future__ import unicode_literals
 
+from collections import deque
+from six.moves import queue
+
+import atexit
 import datetime
-import os
+import errno
+import threading
 
 __all__ = ('History', 'FileHistory')
 
 
 class History(object):
+    #: Maximum number of entries to keep. The oldest entries are dropped.
+    max_size = 10000
+
     def __init__(self):
-        self.strings = []
+        self.strings = deque(maxlen=self.max_size)
 
     def append(self, string):
         self.strings.append(string)
 
     def __getitem__(self, key):
+        # A deque doesn't support slicing.
+        if isinstance(key, slice):
+            return list(self.strings)[key]
+
         return self.strings[key]
 
     def __len__(self):
@@ -26,41 +38,78 @@ class FileHistory(History):
         super(FileHistory, self).__init__()
         self.filename = filename
 
-        self._load()
-
-    def _load(self):
-        lines = []
+        # New entries are written to the file by a background thread, so that
+        # disk I/O doesn't delay the input. (Started on the first append.)
+        self._queue = None
+        self._writer_thread = None
 
-        def add():
-            if lines:
-                # Join and drop trailing newline.
-                string = ''.join(lines)[:-1]
+        # Write the pending entries before the interpreter exits.
+        atexit.register(self.close)
 
-                self.strings.append(string)
+        self._load()
 
-        if os.path.exists(self.filename):
+    def _load(self):
+        try:
             with open(self.filename, 'rb') as f:
-                for line in f:
-                    line = line.decode('utf-8')
-
-                    if line.startswith('+'):
-                        lines.append(line[1:])
-                    else:
-                        add()
-                        lines = []
-
-                add()
-
+                data = f.read().decode('utf-8')
+        except IOError as e:
+            # No history file yet.
+            if e.errno == errno.ENOENT:
+                return
+            raise
+
+        # Every entry starts with a '# <timestamp>' line, followed by the lines
+        # of the entry, each prefixed with a '+'.
+        for block in data.split('\n#'):
+            lines = [l[1:] for l in block.split('\n') if l.startswith('+')]
+            if lines:
+                self.strings.append('\n'.join(lines))
 
     def append(self, string):
         super(FileHistory, self).append(string)
 
         # Save to file.
-        with open(self.filename, 'ab') as f:
-            write = lambda t: f.write(t.encode('utf-8'))
-
-            write('\n# %s\n' % datetime.datetime.now())
-            for line in string.split('\n'):
-                write('+%s\n' % line)
-
-
+        if self._writer_thread is None:
+            # Open the file here, so that an error is raised to the caller.
+            f = open(self.filename, 'ab')
+
+            self._queue = queue.Queue()
+            self._writer_thread = threading.Thread(target=self._write_entries, args=(f, ))
+            self._writer_thread.daemon = True
+            self._writer_thread.start()
+
+        self._queue.put('\n# %s\n%s\n' % (
+            datetime.datetime.now(),
+            '\n'.join('+%s' % line for line in string.split('\n'))))
+
+    def _write_entries(self, f):
+        """
+        Write the queued entries to the file until `None` is received.
+        Entries that are queued at the same time are written at once.
+        """
+        with f:
+            while True:
+                entries = [self._queue.get()]
+
+                try:
+                    while True:
+                        entries.append(self._queue.get_nowait())
+                except queue.Empty:
+                    pass
+
+                f.write(''.join(e for e in entries if e is not None).encode('utf-8'))
+                f.flush()
+
+                if None in entries:
+                    return
+
+    def close(self):
+        """
+        Write the pending entries and close the history file.
+        """
+        if self._writer_thread is not None:
+            self._queue.put(None)
+            self._writer_thread.join()
+
+            self._queue = None
+            self._writer_thread = None
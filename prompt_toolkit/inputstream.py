@@ -95,6 +95,10 @@ class InputStream(object):
     }
 
     def __init__(self, handler, stdout=None):
+        # First characters of all the escape sequences. Any other character
+        # can't start a sequence.
+        self._first_chars = frozenset(k[0] for k in self.CALLBACKS)
+
         self._start_parser()
         self._handler = handler
 
@@ -121,6 +125,7 @@ class InputStream(object):
 
         while True:
             options = self.CALLBACKS
+            first_chars = self._first_chars
             prefix = ''
 
             while True:
@@ -135,8 +140,9 @@ class InputStream(object):
                     break # Reset. Go back to outer loop
 
                 # When the first character matches -> pop first letters in options dict
-                elif c in [ k[0] for k in options.keys() ]:
+                elif c in first_chars:
                     options = { k[1:]: v for k, v in options.items() if k[0] == c }
+                    first_chars = frozenset(k[0] for k in options)
                     prefix += c
 
                 # An 'invalid' sequence, take the first char as literal, and
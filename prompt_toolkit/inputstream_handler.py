@@ -19,6 +19,21 @@ __all__ = (
 )
 
 
+# Characters that can be typed as (part of) the arg count.
+_DIGITS = frozenset('0123456789')
+_DIGITS_NO_ZERO = frozenset('123456789')
+_DIGITS_OR_MINUS = frozenset('-0123456789')
+
+
+def _no_op(func):
+    """
+    Decorator for handlers that don't do anything (yet). The key press is
+    still remembered as the last call, but the handler is not called.
+    """
+    func.no_op = True
+    return func
+
+
 class InputStreamHandler(object):
     """
     This is the base class for :class:`~.EmacsInputStreamHandler` and
@@ -26,8 +41,25 @@ class InputStreamHandler(object):
 
     :attr line: :class:`~prompt_toolkit.line.Line` class.
     """
+    __slots__ = ('_line', '_handlers', '_private_names', '_second_tab',
+                 '_last_call', '_arg_count')
+
     def __init__(self, line):
         self._line = line
+
+        # Map the handler names to bound methods. (One dictionary lookup per
+        # key press, instead of a `getattr` call.)
+        # Handlers that don't do anything are mapped to `None`.
+        cls = type(self)
+        self._handlers = dict(
+            (name, None if getattr(getattr(cls, name), 'no_op', False) else getattr(self, name))
+            for name in dir(cls)
+            if not name.startswith('__') and callable(getattr(cls, name, None)))
+
+        # Calls to these methods don't count as the last call.
+        self._private_names = frozenset(
+            name for name in self._handlers if name.startswith('_'))
+
         self._reset()
 
     def _reset(self):
@@ -37,16 +69,13 @@ class InputStreamHandler(object):
         #: The name of the last previous public function call.
         self._last_call = None
 
-        self.__arg_count = None
-
-    @property
-    def _arg_count(self):
-        """ 'arg' count. For command repeats. """
-        return self.__arg_count
+        #: 'arg' count. For command repeats. (Use `_set_arg_count` to change
+        #: it, that also updates the prompt.)
+        self._arg_count = None
 
-    @_arg_count.setter
-    def _arg_count(self, value):
-        self.__arg_count = value
+    def _set_arg_count(self, value):
+        """ Set the 'arg' count and show it in the prompt. """
+        self._arg_count = value
 
         # Set argument prompt
         if value:
@@ -59,8 +88,8 @@ class InputStreamHandler(object):
             self._second_tab = False
 
         # Call actual handler
-        method = getattr(self, name, None)
-        if method:
+        method = self._handlers.get(name)
+        if method is not None:
             # First, safe current state to undo stack
             if self._needs_to_save(name):
                 self._line.save_to_undo_stack()
@@ -73,7 +102,7 @@ class InputStreamHandler(object):
                 raise
 
         # Keep track of what the last called method was.
-        if not name.startswith('_'):
+        if name not in self._private_names:
             self._last_call = name
 
     def _needs_to_save(self, current_method):
@@ -130,8 +159,7 @@ class InputStreamHandler(object):
         self.enter()
 
     def ctrl_k(self):
-        data = ClipboardData(self._line.delete_until_end_of_line())
-        self._line.set_clipboard(data)
+        _yank_until_eol(self._line)
 
     def ctrl_l(self):
         self._line.clear()
@@ -144,12 +172,14 @@ class InputStreamHandler(object):
     def ctrl_n(self):
         self._line.history_forward()
 
+    @_no_op
     def ctrl_o(self):
         pass
 
     def ctrl_p(self):
         self._line.history_backward()
 
+    @_no_op
     def ctrl_q(self):
         pass
 
@@ -170,6 +200,7 @@ class InputStreamHandler(object):
         data = self._line.delete_from_start_of_line()
         self._line.set_clipboard(ClipboardData(data))
 
+    @_no_op
     def ctrl_v(self):
         pass
 
@@ -177,10 +208,10 @@ class InputStreamHandler(object):
         """
         Delete the word before the cursor.
         """
-        data = ClipboardData(''.join(
-            self._line.delete_word_before_cursor() for i in range(self._arg_count or 1)))
+        data = ClipboardData(self._line.delete_word_before_cursor(count=self._arg_count or 1))
         self._line.set_clipboard(data)
 
+    @_no_op
     def ctrl_x(self):
         pass
 
@@ -188,6 +219,7 @@ class InputStreamHandler(object):
         # Pastes the clipboard content.
         self._line.paste_from_clipboard()
 
+    @_no_op
     def ctrl_z(self):
         pass
 
@@ -248,6 +280,10 @@ class InputStreamHandler(object):
             self._line.return_input()
 
 
+#: Handlers for which the Emacs mode doesn't save the line to the undo stack.
+_EMACS_NO_UNDO_HANDLERS = frozenset(['ctrl_x', 'ctrl_x_ctrl_u', 'ctrl_underscore'])
+
+
 class EmacsInputStreamHandler(InputStreamHandler):
     """
     Some e-macs extensions.
@@ -255,6 +291,17 @@ class EmacsInputStreamHandler(InputStreamHandler):
     # Overview of Readline emacs commands:
     # http://www.catonmat.net/download/readline-emacs-editing-mode-cheat-sheet.pdf
 
+    __slots__ = ('_meta_names', '_ctrl_x_names', '_escape_pressed', '_ctrl_x_pressed')
+
+    def __init__(self, line):
+        super(EmacsInputStreamHandler, self).__init__(line)
+
+        # Map the keys to the names of their `meta_` and `ctrl_x_` handlers.
+        self._meta_names = dict(
+            (name[len('meta_'):], name) for name in self._handlers if name.startswith('meta_'))
+        self._ctrl_x_names = dict(
+            (name[len('ctrl_x_'):], name) for name in self._handlers if name.startswith('ctrl_x_'))
+
     def _reset(self):
         super(EmacsInputStreamHandler, self)._reset()
         self._escape_pressed = False
@@ -274,6 +321,7 @@ class EmacsInputStreamHandler(InputStreamHandler):
     def ctrl_p(self):
         self._line.auto_up()
 
+    @_no_op
     def ctrl_w(self):
         # TODO: cut current region.
         pass
@@ -302,21 +350,21 @@ class EmacsInputStreamHandler(InputStreamHandler):
         if self._escape_pressed:
             if name == 'insert_char':
                 # Handle Alt + digit in the `meta_digit` method.
-                if a[0] in '0123456789' or (a[0] == '-' and self._arg_count == None):
+                if a[0] in _DIGITS or (a[0] == '-' and self._arg_count == None):
                     name = 'meta_digit'
                     reset_arg_count_after_call = False
 
                 # Handle Alt + char in their respective `meta_X` method.
                 else:
-                    name = 'meta_' + a[0]
+                    name = self._meta_names.get(a[0]) or 'meta_' + a[0]
                     a = []
             else:
-                name = 'meta_' + name
+                name = self._meta_names.get(name) or 'meta_' + name
             self._escape_pressed = False
 
         # If Ctrl-x was pressed. Prepend ctrl_x prefix to hander name.
         if self._ctrl_x_pressed:
-            name = 'ctrl_x_%s' % name
+            name = self._ctrl_x_names.get(name) or 'ctrl_x_' + name
 
         super(EmacsInputStreamHandler, self).__call__(name, *a)
 
@@ -324,8 +372,8 @@ class EmacsInputStreamHandler(InputStreamHandler):
         if name == 'escape':
             reset_arg_count_after_call = False
 
-        if reset_arg_count_after_call:
-            self._arg_count = None
+        if reset_arg_count_after_call and self._arg_count is not None:
+            self._set_arg_count(None)
 
         # Reset ctrl_x state.
         if name != 'ctrl_x':
@@ -333,14 +381,15 @@ class EmacsInputStreamHandler(InputStreamHandler):
 
     def _needs_to_save(self, current_method):
         # Don't save the current state at the undo-stack for following methods.
-        if current_method in ('ctrl_x', 'ctrl_x_ctrl_u', 'ctrl_underscore'):
+        if current_method in _EMACS_NO_UNDO_HANDLERS:
             return False
 
         return super(EmacsInputStreamHandler, self)._needs_to_save(current_method)
 
     def insert_char(self, data):
-        for i in range(self._arg_count or 1):
-            super(EmacsInputStreamHandler, self).insert_char(data)
+        """ Insert data at cursor position. (Repeated `arg` times.) """
+        assert len(data) == 1
+        self._line.insert_text(data * (self._arg_count or 1))
 
     def meta_ctrl_j(self):
         """ ALT + Newline """
@@ -354,7 +403,7 @@ class EmacsInputStreamHandler(InputStreamHandler):
 
     def meta_digit(self, digit):
         """ ALT + digit or '-' pressed. """
-        self._arg_count = _arg_count_append(self._arg_count, digit)
+        self._set_arg_count(_arg_count_append(self._arg_count, digit))
 
     def meta_enter(self):
         """ Alt + Enter. Should always accept input. """
@@ -364,6 +413,7 @@ class EmacsInputStreamHandler(InputStreamHandler):
         """ Delete word backwards. """
         self._line.delete_word_before_cursor()
 
+    @_no_op
     def meta_a(self):
         """
         Previous sentence.
@@ -380,6 +430,7 @@ class EmacsInputStreamHandler(InputStreamHandler):
             words = self._line.document.text_after_cursor[:pos]
             self._line.insert_text(words.title(), overwrite=True)
 
+    @_no_op
     def meta_e(self):
         """ Move to end of sentence. """
         # TODO:
@@ -414,6 +465,7 @@ class EmacsInputStreamHandler(InputStreamHandler):
             words = self._line.document.text_after_cursor[:pos]
             self._line.insert_text(words.lower(), overwrite=True)
 
+    @_no_op
     def meta_t(self):
         """
         Swap the last two words before the cursor.
@@ -429,12 +481,14 @@ class EmacsInputStreamHandler(InputStreamHandler):
             words = self._line.document.text_after_cursor[:pos]
             self._line.insert_text(words.upper(), overwrite=True)
 
+    @_no_op
     def meta_w(self):
         """
         Copy current region.
         """
         # TODO
 
+    @_no_op
     def ctrl_space(self):
         """
         Select region.
@@ -448,12 +502,14 @@ class EmacsInputStreamHandler(InputStreamHandler):
         """
         self._line.undo()
 
+    @_no_op
     def meta_backslash(self):
         """
         Delete all spaces and tabs around point.
         (delete-horizontal-space)
         """
 
+    @_no_op
     def meta_star(self):
         """
         `meta-*`: Insert all possible completions of the preceding text.
@@ -480,14 +536,18 @@ class EmacsInputStreamHandler(InputStreamHandler):
 
 
 class ViMode(object):
-    NAVIGATION = 'navigation'
-    INSERT = 'insert'
-    REPLACE = 'replace'
+    """
+    Vi input modes. (Integers, because the mode is compared on every key
+    press.)
+    """
+    NAVIGATION = 0
+    INSERT = 1
+    REPLACE = 2
 
     # TODO: Not supported. But maybe for some day...
-    VISUAL = 'visual'
-    VISUAL_LINE = 'visual-line'
-    VISUAL_BLOCK = 'visual-block'
+    VISUAL = 3
+    VISUAL_LINE = 4
+    VISUAL_BLOCK = 5
 
 
 class ViInputStreamHandler(InputStreamHandler):
@@ -497,10 +557,27 @@ class ViInputStreamHandler(InputStreamHandler):
     # Overview of Readline Vi commands:
     # http://www.catonmat.net/download/bash-vi-editing-mode-cheat-sheet.pdf
     """
+    __slots__ = ('_all_navigation_handles', '_current_handles', '_vi_mode',
+                 '_one_character_callback', '_last_character_find',
+                 '_macro_recording_register', '_macro_recording_calls',
+                 '_macros', '_playing_macro')
+
+    def __init__(self, line):
+        # Trie of the navigation mode key bindings. (Built only once for
+        # every class, the key bindings don't change.)
+        cls = type(self)
+        try:
+            self._all_navigation_handles = _navigation_tries[cls]
+        except KeyError:
+            self._all_navigation_handles = _navigation_tries[cls] = \
+                    _create_trie(self._get_navigation_mode_handles())
+
+        super(ViInputStreamHandler, self).__init__(line)
+
     def _reset(self):
         super(ViInputStreamHandler, self)._reset()
         self._vi_mode = ViMode.INSERT
-        self._all_navigation_handles = self._get_navigation_mode_handles()
+        self._current_handles = self._all_navigation_handles
 
         # Hook for several actions in navigation mode which require an
         # additional key to be typed before they execute.
@@ -530,11 +607,12 @@ class ViInputStreamHandler(InputStreamHandler):
         # After every command, make sure that if we are in navigation mode, we
         # never put the cursor after the last character of a line. (Unless it's
         # an empty line.)
-        if (
-                self._vi_mode == ViMode.NAVIGATION and
-                self._line.document.cursor_at_the_end_of_line and
-                len(self._line.document.current_line) > 0):
-            self._line.cursor_position -= 1
+        if self._vi_mode == ViMode.NAVIGATION:
+            line = self._line
+            document = line.document
+
+            if document.cursor_at_the_end_of_line and len(document.current_line) > 0:
+                line.cursor_position -= 1
 
     def _needs_to_save(self, current_method):
         # Don't create undo entries in the middle of executing a macro.
@@ -550,7 +628,7 @@ class ViInputStreamHandler(InputStreamHandler):
         self._current_handles = self._all_navigation_handles
 
         # Reset arg count.
-        self._arg_count = None
+        self._set_arg_count(None)
 
         # Quit incremental search (if enabled.)
         if self._line.mode == LineMode.INCREMENTAL_SEARCH:
@@ -574,6 +652,7 @@ class ViInputStreamHandler(InputStreamHandler):
         else:
             self._line.cursor_left()
 
+    @_no_op
     def ctrl_v(self):
         # TODO: Insert a character literally (quoted insert).
         pass
@@ -586,479 +665,532 @@ class ViInputStreamHandler(InputStreamHandler):
 
     def _get_navigation_mode_handles(self):
         """
-        Create a dictionary that maps the vi key binding to their handlers.
+        Return a dictionary that maps the vi key bindings to their handlers.
+        (Functions that are called with the `ViInputStreamHandler`, the `Line`
+        and the arg count.) Override this to add or change key bindings.
         """
-        handles = {}
+        # Return a copy, so that subclasses can modify it.
+        return dict(_navigation_handles)
+
+    def insert_char(self, data):
+        """ Insert data at cursor position.  """
+        assert len(data) == 1
+
         line = self._line
+        vi_mode = self._vi_mode
 
-        def handle(key):
-            """ Decorator that registeres the handler function in the handles dict. """
-            def wrapper(func):
-                handles[key] = func
-                return func
-            return wrapper
+        if self._one_character_callback is not None:
+            # Reset the callback before calling it. (Replaying a macro calls
+            # `insert_char` again.)
+            callback = self._one_character_callback
+            self._one_character_callback = None
+            callback(data)
 
-        # List of navigation commands: http://hea-www.harvard.edu/~fine/Tech/vi.html
+        elif line.mode == LineMode.INCREMENTAL_SEARCH:
+            line.insert_text(data)
 
-        @handle('a')
-        def _(arg):
-            self._vi_mode = ViMode.INSERT
-            line.cursor_right()
+        elif vi_mode == ViMode.NAVIGATION:
+            # Always handle numberics to build the arg
+            if data in _DIGITS_NO_ZERO or (self._arg_count and data == '0'):
+                self._set_arg_count(_arg_count_append(self._arg_count, data))
 
-        @handle('A')
-        def _(arg):
-            self._vi_mode = ViMode.INSERT
-            line.cursor_to_end_of_line()
-
-        @handle('b') # Move one word or token left.
-        @handle('B') # Move one non-blank word left ((# TODO: difference between 'b' and 'B')
-        def _(arg):
-            for i in range(arg):
-                line.cursor_word_back()
-
-        @handle('C')
-        @handle('c$')
-        def _(arg):
-            # Change to end of line.
-            data = ClipboardData(line.delete_until_end_of_line())
-            line.set_clipboard(data)
-            self._vi_mode = ViMode.INSERT
+            else:
+                node = self._current_handles.get(data)
 
-        @handle('cc')
-        @handle('S')
-        def _(arg): # TODO: implement 'arg'
-            """ Change current line """
-            # We copy the whole line.
-            data = ClipboardData(line.document.current_line, ClipboardDataType.LINES)
-            line.set_clipboard(data)
-
-            # But we delete after the whitespace
-            line.cursor_to_start_of_line(after_whitespace=True)
-            line.delete_until_end_of_line()
-            self._vi_mode = ViMode.INSERT
+                # No match. Reset.
+                if node is None:
+                    self._current_handles = self._all_navigation_handles
 
-        @handle('cw')
-        @handle('ce')
-        def _(arg):
-            data = ClipboardData(''.join(line.delete_word() for i in range(arg)))
-            line.set_clipboard(data)
-            self._vi_mode = ViMode.INSERT
+                # If we have a handle for the current keypress. Call it.
+                elif _LEAF in node:
+                    # Pass argument to handle.
+                    arg_count = self._arg_count
+                    self._set_arg_count(None)
 
-        @handle('D')
-        def _(arg):
-            data = ClipboardData(line.delete_until_end_of_line())
-            line.set_clipboard(data)
-
-        @handle('dd')
-        def _(arg):
-            text = '\n'.join(line.delete_current_line() for i in range(arg))
-            data = ClipboardData(text, ClipboardDataType.LINES)
-            line.set_clipboard(data)
-
-        @handle('d$')
-        def _(arg):
-            # Delete until end of line.
-            data = ClipboardData(line.delete_until_end_of_line())
-            line.set_clipboard(data)
-
-        @handle('dw')
-        def _(arg):
-            data = ClipboardData(''.join(line.delete_word() for i in range(arg)))
-            line.set_clipboard(data)
-
-        @handle('e') # Move to the end of the current word
-        @handle('E') # Move to the end of the current non-blank word. (# TODO: diff between 'e' and 'E')
-        def _(arg):
-            # End of word
-            line.cursor_to_end_of_word()
-
-        @handle('f')
-        def _(arg):
-            # Go to next occurance of character. Typing 'fx' will move the
-            # cursor to the next occurance of character. 'x'.
-            def cb(char):
-                self._last_character_find = (char, False)
-
-                for i in range(arg):
-                    line.go_to_substring(char, in_current_line=True)
-            self._one_character_callback = cb
-
-        @handle('F')
-        def _(arg):
-            # Go to previous occurance of character. Typing 'Fx' will move the
-            # cursor to the previous occurance of character. 'x'.
-            def cb(char):
-                self._last_character_find = (char, True)
-
-                for i in range(arg):
-                    line.go_to_substring(char, in_current_line=True, backwards=True)
-            self._one_character_callback = cb
-
-        @handle('G')
-        def _(arg):
-            # Move to the history line n (you may specify the argument n by
-            # typing it on number keys, for example, 15G)
-            if arg < len(line._working_lines) + 1:
-                line._working_index = arg - 1
-
-        @handle('h')
-        def _(arg):
-            for i in range(arg):
-                line.cursor_left()
-
-        @handle('H')
-        def _(arg):
-            # Vi moves to the start of the visible region.
-            # cursor position 0 is okay for us.
-            line.cursor_position = 0
-
-        @handle('i')
-        def _(arg):
-            self._vi_mode = ViMode.INSERT
+                    # Safe state (except if we called the 'undo' action.)
+                    if data != 'u':
+                        line.save_to_undo_stack()
 
-        @handle('I')
-        def _(arg):
-            self._vi_mode = ViMode.INSERT
-            line.cursor_to_start_of_line(after_whitespace=True)
-
-        @handle('j')
-        def _(arg):
-            for i in range(arg):
-                line.auto_down()
-
-        @handle('J')
-        def _(arg):
-            line.join_next_line()
-
-        @handle('k')
-        def _(arg):
-            for i in range(arg):
-                line.auto_up()
-
-        @handle('l')
-        @handle(' ')
-        def _(arg):
-            for i in range(arg):
-                line.cursor_right()
-
-        @handle('L')
-        def _(arg):
-            # Vi moves to the start of the visible region.
-            # cursor position 0 is okay for us.
-            line.cursor_position = len(line.text)
-
-        @handle('n')
-        def _(arg):
-            # TODO:
-            pass
-
-            # if line.isearch_state:
-            #     # Repeat search in the same direction as previous.
-            #     line.search_next(line.isearch_state.isearch_direction)
-
-        @handle('N')
-        def _(arg):
-            # TODO:
-            pass
-
-            #if line.isearch_state:
-            #    # Repeat search in the opposite direction as previous.
-            #    if line.isearch_state.isearch_direction == IncrementalSearchDirection.FORWARD:
-            #        line.search_next(IncrementalSearchDirection.BACKWARD)
-            #    else:
-            #        line.search_next(IncrementalSearchDirection.FORWARD)
-
-        @handle('p')
-        def _(arg):
-            # Paste after
-            for i in range(arg):
-                line.paste_from_clipboard()
-
-        @handle('P')
-        def _(arg):
-            # Paste before
-            for i in range(arg):
-                line.paste_from_clipboard(before=True)
-
-        @handle('r')
-        def _(arg):
-            # Replace single character under cursor
-            def cb(char):
-                line.insert_text(char * arg, overwrite=True)
-            self._one_character_callback = cb
-
-        @handle('R')
-        def _(arg):
-            # Go to 'replace'-mode.
-            self._vi_mode = ViMode.REPLACE
-
-        @handle('s')
-        def _(arg):
-            # Substitute with new text
-            # (Delete character(s) and go to insert mode.)
-            data = ClipboardData(''.join(line.delete() for i in range(arg)))
-            line.set_clipboard(data)
-            self._vi_mode = ViMode.INSERT
+                    # Call handler
+                    node[_LEAF](self, line, arg_count or 1)
+                    self._current_handles = self._all_navigation_handles
 
-        @handle('t')
-        def _(arg):
-            # Move right to the next occurance of c, then one char backward.
-            def cb(char):
-                for i in range(arg):
-                    line.go_to_substring(char, in_current_line=True)
-                line.cursor_left()
-            self._one_character_callback = cb
-
-        @handle('T')
-        def _(arg):
-            # Move left to the previous occurance of c, then one char forward.
-            def cb(char):
-                for i in range(arg):
-                    line.go_to_substring(char, in_current_line=True, backwards=True)
-                line.cursor_right()
-            self._one_character_callback = cb
-
-        @handle('u')
-        def _(arg):
-            for i in range(arg):
-                line.undo()
-
-        @handle('v')
-        def _(arg):
-            line.open_in_editor()
-
-        @handle('w') # Move one word or token right.
-        @handle('W') # Move one non-blank word right. (# TODO: difference between 'w' and 'W')
-        def _(arg):
-            for i in range(arg):
-                line.cursor_word_forward()
-
-        @handle('x')
-        def _(arg):
-            # Delete character.
-            data = ClipboardData(''.join(line.delete() for i in range(arg)))
-            line.set_clipboard(data)
-
-        @handle('X')
-        def _(arg):
-            line.delete_character_before_cursor()
-
-        @handle('yy')
-        def _(arg):
-            # Yank the whole line.
-            text = '\n'.join(line.document.lines_from_current[:arg])
-
-            data = ClipboardData(text, ClipboardDataType.LINES)
-            line.set_clipboard(data)
-
-        @handle('yw')
-        def _(arg):
-            # Yank word.
-            pass
-
-        @handle('^')
-        def _(arg):
-            line.cursor_to_start_of_line(after_whitespace=True)
-
-        @handle('0')
-        def _(arg):
-            # Move to the beginning of line.
-            line.cursor_to_start_of_line(after_whitespace=False)
-
-        @handle('$')
-        def _(arg):
-            line.cursor_to_end_of_line()
-
-        @handle('%')
-        def _(arg):
-            # Move to the corresponding opening/closing bracket (()'s, []'s and {}'s).
-            line.go_to_matching_bracket()
-
-        @handle('+')
-        def _(arg):
-            # Move to first non whitespace of next line
-            for i in range(arg):
-                line.cursor_down()
-            line.cursor_to_start_of_line(after_whitespace=True)
-
-        @handle('-')
-        def _(arg):
-            # Move to first non whitespace of previous line
-            for i in range(arg):
-                line.cursor_up()
-            line.cursor_to_start_of_line(after_whitespace=True)
-
-        @handle('{')
-        def _(arg):
-            # Move to previous blank-line separated section.
-            for i in range(arg):
-                index = line.document.find_previous_matching_line(
-                                lambda text: not text or text.isspace())
-
-                if index is not None:
-                    for i in range(-index):
-                        line.cursor_up()
-
-        @handle('}')
-        def _(arg):
-            # Move to next blank-line separated section.
-            for i in range(arg):
-                index = line.document.find_next_matching_line(
-                                lambda text: not text or text.isspace())
-
-                if index is not None:
-                    for i in range(index):
-                        line.cursor_down()
-
-        @handle('>>')
-        def _(arg):
-            # Indent lines.
-            current_line = line.document.cursor_position_row
-            line_range = range(current_line, current_line + arg)
-            line.transform_lines(line_range, lambda l: '    ' + l)
-
-            line.cursor_to_start_of_line(after_whitespace=True)
-
-        @handle('<<')
-        def _(arg):
-            # Unindent current line.
-            current_line = line.document.cursor_position_row
-            line_range = range(current_line, current_line + arg)
-
-            def transform(text):
-                if text.startswith('    '):
-                    return text[4:]
+                # If there are several combitations of handles, starting with
+                # the keys that were already pressed. Go one level deeper in
+                # the trie.
                 else:
-                    return text.lstrip()
+                    self._current_handles = node
 
-            line.transform_lines(line_range, transform)
-            line.cursor_to_start_of_line(after_whitespace=True)
+        # In replace/text mode.
+        elif vi_mode == ViMode.REPLACE:
+            line.insert_text(data, overwrite=True)
 
-        @handle('O')
-        def _(arg):
-            # Open line above and enter insertion mode
-            line.insert_line_above()
-            self._vi_mode = ViMode.INSERT
+        # In insert/text mode.
+        elif vi_mode == ViMode.INSERT:
+            super(ViInputStreamHandler, self).insert_char(data)
 
-        @handle('o')
-        def _(arg):
-            # Open line below and enter insertion mode
-            line.insert_line_below()
-            self._vi_mode = ViMode.INSERT
 
-        @handle('q')
-        def _(arg):
-            # Start/stop recording macro.
-            if self._macro_recording_register:
-                # Save macro.
-                self._macros[self._macro_recording_register] = self._macro_recording_calls
-                self._macro_recording_register = None
-            else:
-                # Start new macro.
-                def cb(char):
-                    self._macro_recording_register = char
-                    self._macro_recording_calls = []
-
-                self._one_character_callback = cb
-
-        @handle('@')
-        def _(arg):
-            # Execute macro.
-            def cb(char):
-                if char in self._macros:
-                    self._playing_macro = True
-
-                    for command in self._macros[char]:
-                        self(*command)
-
-                    self._playing_macro = False
-
-            self._one_character_callback = cb
-
-        @handle('~')
-        def _(arg):
-            """ Reverse case of current character and move cursor forward. """
-            c = line.document.current_char
-            if c is not None and c != '\n':
-                c = (c.upper() if c.islower() else c.lower())
-                line.insert_text(c, overwrite=True)
-
-        @handle('|')
-        def _(arg):
-            # Move to the n-th column (you may specify the argument n by typing
-            # it on number keys, for example, 20|).
-            line.go_to_column(arg)
-
-        @handle('/')
-        def _(arg):
-            # Search history backward for a command matching string.
-            self._line.reverse_search()
-            self._vi_mode = ViMode.INSERT # We have to be able to insert the search string.
-
-        @handle('?')
-        def _(arg):
-            # Search history forward for a command matching string.
-            self._line.forward_search()
-            self._vi_mode = ViMode.INSERT # We have to be able to insert the search string.
-
-        @handle(';')
-        def _(arg):
-            # Repeat the last 'f' or 'F' command.
-            if self._last_character_find:
-                char, backwards = self._last_character_find
-
-                for i in range(arg):
-                    line.go_to_substring(char, in_current_line=True, backwards=backwards)
-
-        return handles
+def _yank_until_eol(line):
+    """ Delete until the end of the line, and put the text on the clipboard. """
+    line.set_clipboard(ClipboardData(line.delete_until_end_of_line()))
+
+
+#: Maps the vi key bindings in navigation mode to their handlers.
+_navigation_handles = {}
+
+
+def _handle(*keys):
+    """ Decorator that registeres the handler function in the handles dict,
+    for each of the given key bindings. """
+    def wrapper(func):
+        for key in keys:
+            _navigation_handles[key] = func
+        return func
+    return wrapper
+
+
+# List of navigation commands: http://hea-www.harvard.edu/~fine/Tech/vi.html
+
+@_handle('a')
+def _(handler, line, arg):
+    handler._vi_mode = ViMode.INSERT
+    line.cursor_right()
+
+@_handle('A')
+def _(handler, line, arg):
+    handler._vi_mode = ViMode.INSERT
+    line.cursor_to_end_of_line()
+
+# b: Move one word or token left.
+# B: Move one non-blank word left ((# TODO: difference between 'b' and 'B')
+@_handle('b', 'B')
+def _(handler, line, arg):
+    cursor_word_back = line.cursor_word_back
+    for i in range(arg):
+        cursor_word_back()
+
+@_handle('C', 'c$')
+def _(handler, line, arg):
+    # Change to end of line.
+    _yank_until_eol(line)
+    handler._vi_mode = ViMode.INSERT
+
+@_handle('cc', 'S')
+def _(handler, line, arg): # TODO: implement 'arg'
+    """ Change current line """
+    # We copy the whole line.
+    data = ClipboardData(line.document.current_line, ClipboardDataType.LINES)
+    line.set_clipboard(data)
+
+    # But we delete after the whitespace
+    line.cursor_to_start_of_line(after_whitespace=True)
+    line.delete_until_end_of_line()
+    handler._vi_mode = ViMode.INSERT
+
+@_handle('cw', 'ce')
+def _(handler, line, arg):
+    data = ClipboardData(line.delete_word(count=arg))
+    line.set_clipboard(data)
+    handler._vi_mode = ViMode.INSERT
+
+@_handle('D', 'd$')
+def _(handler, line, arg):
+    # Delete until end of line.
+    _yank_until_eol(line)
+
+@_handle('dd')
+def _(handler, line, arg):
+    delete_current_line = line.delete_current_line
+    text = '\n'.join([delete_current_line() for i in range(arg)])
+    data = ClipboardData(text, ClipboardDataType.LINES)
+    line.set_clipboard(data)
+
+@_handle('dw')
+def _(handler, line, arg):
+    data = ClipboardData(line.delete_word(count=arg))
+    line.set_clipboard(data)
+
+# e: Move to the end of the current word
+# E: Move to the end of the current non-blank word. (# TODO: diff between 'e' and 'E')
+@_handle('e', 'E')
+def _(handler, line, arg):
+    # End of word
+    line.cursor_to_end_of_word()
+
+@_handle('f')
+def _(handler, line, arg):
+    # Go to next occurance of character. Typing 'fx' will move the
+    # cursor to the next occurance of character. 'x'.
+    def cb(char):
+        handler._last_character_find = (char, False)
+
+        go_to_substring = line.go_to_substring
+        for i in range(arg):
+            go_to_substring(char, in_current_line=True)
+    handler._one_character_callback = cb
+
+@_handle('F')
+def _(handler, line, arg):
+    # Go to previous occurance of character. Typing 'Fx' will move the
+    # cursor to the previous occurance of character. 'x'.
+    def cb(char):
+        handler._last_character_find = (char, True)
+
+        go_to_substring = line.go_to_substring
+        for i in range(arg):
+            go_to_substring(char, in_current_line=True, backwards=True)
+    handler._one_character_callback = cb
+
+@_handle('G')
+def _(handler, line, arg):
+    # Move to the history line n (you may specify the argument n by
+    # typing it on number keys, for example, 15G)
+    if arg < len(line._working_lines) + 1:
+        line._working_index = arg - 1
+
+@_handle('h')
+def _(handler, line, arg):
+    line.cursor_left(count=arg)
+
+@_handle('H')
+def _(handler, line, arg):
+    # Vi moves to the start of the visible region.
+    # cursor position 0 is okay for us.
+    line.cursor_position = 0
+
+@_handle('i')
+def _(handler, line, arg):
+    handler._vi_mode = ViMode.INSERT
+
+@_handle('I')
+def _(handler, line, arg):
+    handler._vi_mode = ViMode.INSERT
+    line.cursor_to_start_of_line(after_whitespace=True)
+
+@_handle('j')
+def _(handler, line, arg):
+    auto_down = line.auto_down
+    for i in range(arg):
+        auto_down()
+
+@_handle('J')
+def _(handler, line, arg):
+    line.join_next_line()
+
+@_handle('k')
+def _(handler, line, arg):
+    auto_up = line.auto_up
+    for i in range(arg):
+        auto_up()
+
+@_handle('l', ' ')
+def _(handler, line, arg):
+    line.cursor_right(count=arg)
+
+@_handle('L')
+def _(handler, line, arg):
+    # Vi moves to the start of the visible region.
+    # cursor position 0 is okay for us.
+    line.cursor_position = len(line.text)
+
+@_handle('n')
+def _(handler, line, arg):
+    # TODO:
+    pass
+
+    # if line.isearch_state:
+    #     # Repeat search in the same direction as previous.
+    #     line.search_next(line.isearch_state.isearch_direction)
+
+@_handle('N')
+def _(handler, line, arg):
+    # TODO:
+    pass
+
+    #if line.isearch_state:
+    #    # Repeat search in the opposite direction as previous.
+    #    if line.isearch_state.isearch_direction == IncrementalSearchDirection.FORWARD:
+    #        line.search_next(IncrementalSearchDirection.BACKWARD)
+    #    else:
+    #        line.search_next(IncrementalSearchDirection.FORWARD)
+
+@_handle('p')
+def _(handler, line, arg):
+    # Paste after
+    line.paste_from_clipboard(count=arg)
+
+@_handle('P')
+def _(handler, line, arg):
+    # Paste before
+    line.paste_from_clipboard(before=True, count=arg)
+
+@_handle('r')
+def _(handler, line, arg):
+    # Replace single character under cursor
+    def cb(char):
+        line.insert_text(char * arg, overwrite=True)
+    handler._one_character_callback = cb
+
+@_handle('R')
+def _(handler, line, arg):
+    # Go to 'replace'-mode.
+    handler._vi_mode = ViMode.REPLACE
+
+@_handle('s')
+def _(handler, line, arg):
+    # Substitute with new text
+    # (Delete character(s) and go to insert mode.)
+    data = ClipboardData(line.delete(count=arg))
+    line.set_clipboard(data)
+    handler._vi_mode = ViMode.INSERT
+
+@_handle('t')
+def _(handler, line, arg):
+    # Move right to the next occurance of c, then one char backward.
+    def cb(char):
+        go_to_substring = line.go_to_substring
+        for i in range(arg):
+            go_to_substring(char, in_current_line=True)
+        line.cursor_left()
+    handler._one_character_callback = cb
+
+@_handle('T')
+def _(handler, line, arg):
+    # Move left to the previous occurance of c, then one char forward.
+    def cb(char):
+        go_to_substring = line.go_to_substring
+        for i in range(arg):
+            go_to_substring(char, in_current_line=True, backwards=True)
+        line.cursor_right()
+    handler._one_character_callback = cb
+
+@_handle('u')
+def _(handler, line, arg):
+    undo = line.undo
+    for i in range(arg):
+        undo()
+
+@_handle('v')
+def _(handler, line, arg):
+    line.open_in_editor()
+
+# w: Move one word or token right.
+# W: Move one non-blank word right. (# TODO: difference between 'w' and 'W')
+@_handle('w', 'W')
+def _(handler, line, arg):
+    cursor_word_forward = line.cursor_word_forward
+    for i in range(arg):
+        cursor_word_forward()
+
+@_handle('x')
+def _(handler, line, arg):
+    # Delete character.
+    data = ClipboardData(line.delete(count=arg))
+    line.set_clipboard(data)
+
+@_handle('X')
+def _(handler, line, arg):
+    line.delete_character_before_cursor()
+
+@_handle('yy')
+def _(handler, line, arg):
+    # Yank the whole line.
+    text = '\n'.join(line.document.lines_from_current[:arg])
+
+    data = ClipboardData(text, ClipboardDataType.LINES)
+    line.set_clipboard(data)
+
+@_handle('yw')
+def _(handler, line, arg):
+    # Yank word.
+    pass
+
+@_handle('^')
+def _(handler, line, arg):
+    line.cursor_to_start_of_line(after_whitespace=True)
+
+@_handle('0')
+def _(handler, line, arg):
+    # Move to the beginning of line.
+    line.cursor_to_start_of_line(after_whitespace=False)
+
+@_handle('$')
+def _(handler, line, arg):
+    line.cursor_to_end_of_line()
+
+@_handle('%')
+def _(handler, line, arg):
+    # Move to the corresponding opening/closing bracket (()'s, []'s and {}'s).
+    line.go_to_matching_bracket()
+
+@_handle('+')
+def _(handler, line, arg):
+    # Move to first non whitespace of next line
+    cursor_down = line.cursor_down
+    for i in range(arg):
+        cursor_down()
+    line.cursor_to_start_of_line(after_whitespace=True)
+
+@_handle('-')
+def _(handler, line, arg):
+    # Move to first non whitespace of previous line
+    cursor_up = line.cursor_up
+    for i in range(arg):
+        cursor_up()
+    line.cursor_to_start_of_line(after_whitespace=True)
+
+@_handle('{')
+def _(handler, line, arg):
+    # Move to previous blank-line separated section.
+    for i in range(arg):
+        index = line.document.find_previous_matching_line(
+                        lambda text: not text or text.isspace())
+
+        if index is not None:
+            cursor_up = line.cursor_up
+            for i in range(-index):
+                cursor_up()
+
+@_handle('}')
+def _(handler, line, arg):
+    # Move to next blank-line separated section.
+    for i in range(arg):
+        index = line.document.find_next_matching_line(
+                        lambda text: not text or text.isspace())
+
+        if index is not None:
+            cursor_down = line.cursor_down
+            for i in range(index):
+                cursor_down()
+
+@_handle('>>')
+def _(handler, line, arg):
+    # Indent lines.
+    current_line = line.document.cursor_position_row
+    line_range = range(current_line, current_line + arg)
+    line.transform_lines(line_range, lambda l: '    ' + l)
+
+    line.cursor_to_start_of_line(after_whitespace=True)
+
+@_handle('<<')
+def _(handler, line, arg):
+    # Unindent current line.
+    current_line = line.document.cursor_position_row
+    line_range = range(current_line, current_line + arg)
+
+    def transform(text):
+        if text.startswith('    '):
+            return text[4:]
+        else:
+            return text.lstrip()
+
+    line.transform_lines(line_range, transform)
+    line.cursor_to_start_of_line(after_whitespace=True)
+
+@_handle('O')
+def _(handler, line, arg):
+    # Open line above and enter insertion mode
+    line.insert_line_above()
+    handler._vi_mode = ViMode.INSERT
+
+@_handle('o')
+def _(handler, line, arg):
+    # Open line below and enter insertion mode
+    line.insert_line_below()
+    handler._vi_mode = ViMode.INSERT
+
+@_handle('q')
+def _(handler, line, arg):
+    # Start/stop recording macro.
+    if handler._macro_recording_register:
+        # Save macro. (Without the 'q' that stops the recording. Replaying it
+        # would start recording again.)
+        handler._macros[handler._macro_recording_register] = handler._macro_recording_calls[:-1]
+        handler._macro_recording_register = None
+    else:
+        # Start new macro.
+        def cb(char):
+            handler._macro_recording_register = char
+            handler._macro_recording_calls = []
 
-    def insert_char(self, data):
-        """ Insert data at cursor position.  """
-        assert len(data) == 1
+        handler._one_character_callback = cb
 
-        if self._one_character_callback:
-            self._one_character_callback(data)
-            self._one_character_callback = False
+@_handle('@')
+def _(handler, line, arg):
+    # Execute macro.
+    def cb(char):
+        if char in handler._macros:
+            handler._playing_macro = True
 
-        elif self._line.mode == LineMode.INCREMENTAL_SEARCH:
-            self._line.insert_text(data)
+            for command in handler._macros[char]:
+                handler(*command)
 
-        elif self._vi_mode == ViMode.NAVIGATION:
-            # Always handle numberics to build the arg
-            if data in '123456789' or (self._arg_count and data == '0'):
-                self._arg_count = _arg_count_append(self._arg_count, data)
-
-            # If we have a handle for the current keypress. Call it.
-            elif data in self._current_handles:
-                # Pass argument to handle.
-                arg_count = self._arg_count
-                self._arg_count = None
-
-                # Safe state (except if we called the 'undo' action.)
-                if data != 'u':
-                    self._line.save_to_undo_stack()
-
-                # Call handler
-                self._current_handles[data](arg_count or 1)
-                self._current_handles = self._all_navigation_handles
-
-            # If there are several combitations of handles, starting with the
-            # keys that were already pressed. Reduce to this subset of
-            # handlers.
-            elif data in [ k[0] for k in self._current_handles.keys() ]:
-                self._current_handles = { k[1:]:h for k, h in self._current_handles.items() if k[0] == data }
-
-            # No match. Reset.
-            else:
-                self._current_handles = self._all_navigation_handles
+            handler._playing_macro = False
 
-        # In replace/text mode.
-        elif self._vi_mode == ViMode.REPLACE:
-            self._line.insert_text(data, overwrite=True)
+    handler._one_character_callback = cb
 
-        # In insert/text mode.
-        elif self._vi_mode == ViMode.INSERT:
-            super(ViInputStreamHandler, self).insert_char(data)
+@_handle('~')
+def _(handler, line, arg):
+    """ Reverse case of current character and move cursor forward. """
+    c = line.document.current_char
+    if c is not None and c != '\n':
+        c = (c.upper() if c.islower() else c.lower())
+        line.insert_text(c, overwrite=True)
+
+@_handle('|')
+def _(handler, line, arg):
+    # Move to the n-th column (you may specify the argument n by typing
+    # it on number keys, for example, 20|).
+    line.go_to_column(arg)
+
+@_handle('/')
+def _(handler, line, arg):
+    # Search history backward for a command matching string.
+    line.reverse_search()
+    handler._vi_mode = ViMode.INSERT # We have to be able to insert the search string.
+
+@_handle('?')
+def _(handler, line, arg):
+    # Search history forward for a command matching string.
+    line.forward_search()
+    handler._vi_mode = ViMode.INSERT # We have to be able to insert the search string.
+
+@_handle(';')
+def _(handler, line, arg):
+    # Repeat the last 'f' or 'F' command.
+    if handler._last_character_find:
+        char, backwards = handler._last_character_find
+
+        go_to_substring = line.go_to_substring
+        for i in range(arg):
+            go_to_substring(char, in_current_line=True, backwards=backwards)
+
+
+#: Key in a trie node, for the handler of the key sequence that ends there.
+_LEAF = object()
+
+#: Maps `ViInputStreamHandler` classes to the trie of their navigation handles.
+_navigation_tries = {}
+
+
+def _create_trie(handles):
+    """
+    Turn a dictionary that maps key sequences to handlers into a trie of
+    nested dictionaries, with one level for every typed character.
+    """
+    root = {}
+
+    for keys, handler in handles.items():
+        node = root
+        for c in keys:
+            node = node.setdefault(c, {})
+        node[_LEAF] = handler
+
+    return root
+
+
+#: Upper bound for the arg count. (In both directions.)
+_ARG_COUNT_MAX = 1000000
 
 
 def _arg_count_append(current, data):
@@ -1069,17 +1201,21 @@ def _arg_count_append(current, data):
     :param data: the typed digit as string
     :returns: int or None
     """
-    assert data in '-0123456789'
+    assert data in _DIGITS_OR_MINUS
 
     if current is None:
         if data == '-':
-            data = '-1'
+            return -1
         result = int(data)
     else:
-        result = int("%s%s" % (current, data))
+        digit = ord(data) - ord('0')
+        if current < 0:
+            result = current * 10 - digit
+        else:
+            result = current * 10 + digit
 
     # Don't exceed a million.
-    if int(result) >= 1000000:
+    if abs(result) >= _ARG_COUNT_MAX:
         result = None
 
     return result
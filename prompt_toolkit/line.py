@@ -150,7 +150,7 @@ class Line(object):
 
         self._clipboard = ClipboardData()
 
-        self.__cursor_position = 0
+        self._cursor_position_value = 0
 
         #: Readline argument text (for displaying in the prompt.)
         #: https://www.gnu.org/software/bash/manual/html_node/Readline-Arguments.html
@@ -179,19 +179,19 @@ class Line(object):
         #: Ctrl-C should reset this, and copy the whole history back in here.
         #: Enter should process the current command and append to the real
         #: history.
-        self._working_lines = self._history.strings[:]
+        self._working_lines = list(self._history.strings)
         self._working_lines.append(initial_value)
-        self.__working_index = len(self._working_lines) - 1
+        self._working_index_value = len(self._working_lines) - 1
 
     ### <getters/setters>
 
     @property
     def text(self):
-        return self._working_lines[self._working_index]
+        return self._working_lines[self._working_index_value]
 
     @text.setter
     def text(self, value):
-        self._working_lines[self._working_index] = value
+        self._working_lines[self._working_index_value] = value
 
         # Always quit autocomplete mode when the text changes.
         if self.mode == LineMode.COMPLETE:
@@ -204,11 +204,11 @@ class Line(object):
 
     @property
     def cursor_position(self):
-        return self.__cursor_position
+        return self._cursor_position_value
 
     @cursor_position.setter
     def cursor_position(self, value):
-        self.__cursor_position = max(0, value)
+        self._cursor_position_value = max(0, value)
 
         # Always quit autocomplete mode when the cursor position changes.
         if self.mode == LineMode.COMPLETE:
@@ -219,7 +219,7 @@ class Line(object):
 
     @property
     def _working_index(self):
-        return self.__working_index
+        return self._working_index_value
 
     @_working_index.setter
     def _working_index(self, value):
@@ -227,7 +227,7 @@ class Line(object):
         if self.mode == LineMode.COMPLETE:
             self.mode = LineMode.NORMAL
 
-        self.__working_index = value
+        self._working_index_value = value
         self._text_changed()
 
     ### End of <getters/setters>
@@ -315,14 +315,24 @@ class Line(object):
         self.cursor_position = len(self.text)
 
     @_to_mode(LineMode.NORMAL)
-    def cursor_left(self):
-        if self.document.cursor_position_col > 0:
-            self.cursor_position -= 1
+    def cursor_left(self, count=1):
+        """
+        Move the cursor `count` characters to the left, but not beyond the
+        start of the current line.
+        """
+        col = self.document.cursor_position_col
+        if col > 0:
+            self.cursor_position -= min(count, col)
 
     @_to_mode(LineMode.NORMAL)
-    def cursor_right(self):
-        if not self.document.cursor_at_the_end_of_line:
-            self.cursor_position += 1
+    def cursor_right(self, count=1):
+        """
+        Move the cursor `count` characters to the right, but not beyond the
+        end of the current line.
+        """
+        after_cursor = self.document.current_line_after_cursor
+        if after_cursor:
+            self.cursor_position += min(count, len(after_cursor))
 
     @_to_mode(LineMode.NORMAL)
     def cursor_up(self):
@@ -439,16 +449,38 @@ class Line(object):
             return ''
 
     @_to_mode(LineMode.NORMAL)
-    def delete_word(self):
-        """ Delete one word. Return deleted word. """
-        to_delete = self.document.find_next_word_beginning()
+    def delete_word(self, count=1):
+        """ Delete `count` words. Return deleted text. """
+        to_delete = 0
+
+        for i in range(count):
+            pos = Document(self.text, self.cursor_position + to_delete).find_next_word_beginning()
+
+            # No next word. Delete until the end.
+            if pos is None:
+                to_delete = None
+                break
+
+            to_delete += pos
+
         return self.delete(count=to_delete)
 
     @_to_mode(LineMode.NORMAL)
-    def delete_word_before_cursor(self): # TODO: unittest
-        """ Delete one word before cursor. Return deleted word. """
-        to_delete = - (self.document.find_start_of_previous_word() or 0)
-        return self.delete_character_before_cursor(to_delete)
+    def delete_word_before_cursor(self, count=1):
+        """ Delete `count` words before cursor. Return deleted text. """
+        to_delete = 0
+
+        for i in range(count):
+            pos = Document(self.text, self.cursor_position - to_delete).find_start_of_previous_word()
+            if pos is None:
+                break
+
+            to_delete -= pos
+
+        if to_delete:
+            return self.delete_character_before_cursor(to_delete)
+        else:
+            return ''
 
     @_to_mode(LineMode.NORMAL)
     def delete_until_end(self):
@@ -777,27 +809,31 @@ class Line(object):
         self._clipboard = clipboard_data
 
     @_to_mode(LineMode.NORMAL)
-    def paste_from_clipboard(self, before=False):
+    def paste_from_clipboard(self, before=False, count=1):
         """
-        Insert the data from the clipboard.
+        Insert the data from the clipboard, `count` times.
         """
         if self._clipboard and self._clipboard.text:
             if self._clipboard.type == ClipboardDataType.CHARACTERS:
+                text = self._clipboard.text * count
+
                 if before:
-                    self.insert_text(self._clipboard.text)
+                    self.insert_text(text)
                 else:
                     self.cursor_right()
-                    self.insert_text(self._clipboard.text)
+                    self.insert_text(text)
                     self.cursor_left()
 
             elif self._clipboard.type == ClipboardDataType.LINES:
+                text = '\n'.join([self._clipboard.text] * count)
+
                 if before:
                     self.cursor_to_start_of_line()
-                    self.insert_text(self._clipboard.text + '\n', move_cursor=False)
+                    self.insert_text(text + '\n', move_cursor=False)
                 else:
                     self.cursor_to_end_of_line()
                     self.insert_text('\n')
-                    self.insert_text(self._clipboard.text, move_cursor=False)
+                    self.insert_text(text, move_cursor=False)
 
     @_to_mode(LineMode.NORMAL)
     def undo(self):
@@ -3,12 +3,12 @@ Renders the command line on the console.
 (Redraws parts of the input line that were changed.)
 """
 from __future__ import unicode_literals
+import re
 import sys
 import six
 
 from .utils import get_size
 from .libs.wcwidth import wcwidth
-from collections import defaultdict
 
 from pygments.formatters.terminal256 import Terminal256Formatter, EscapeSequence
 from pygments.style import Style
@@ -22,6 +22,71 @@ __all__ = (
     'Renderer',
 )
 
+# Maps (color, bgcolor, bold, underline) to (color_string, reset_string).
+_escape_codes_cache = {}
+
+
+def _get_escape_codes(style):
+    """
+    Return the (color_string, reset_string) escape sequences for the given
+    pygments style dictionary.
+    """
+    key = (style['color'], style['bgcolor'],
+           style.get('bold', False), style.get('underline', False))
+
+    try:
+        return _escape_codes_cache[key]
+    except KeyError:
+        color, bgcolor, bold, underline = key
+
+        e = EscapeSequence(
+                fg=(_tf._color_index(color) if color else None),
+                bg=(_tf._color_index(bgcolor) if bgcolor else None),
+                bold=bold,
+                underline=underline)
+
+        result = _escape_codes_cache[key] = (e.color_string(), e.reset_string())
+        return result
+
+
+# Text that consists only of printable ASCII characters. (Every character is
+# exactly one column wide.)
+_printable_ascii_re = re.compile(r'^[\x20-\x7e]+$')
+
+# Widths of the ASCII characters, and a cache for all the others.
+_ascii_widths = [wcwidth(six.unichr(i)) for i in range(128)]
+_char_width_cache = {}
+
+
+def _char_width(char):
+    """
+    Return the `wcwidth` of this character.
+    """
+    o = ord(char)
+
+    if o < 128:
+        return _ascii_widths[o]
+
+    try:
+        return _char_width_cache[char]
+    except KeyError:
+        result = _char_width_cache[char] = wcwidth(char)
+        return result
+
+
+def _create_cursor_codes(letter, count=256):
+    """
+    Create the table of cursor movement codes for the amounts 0 until count.
+    """
+    return ['\x1b[%s' % letter if i == 1 else '\x1b[%i%s' % (i, letter)
+            for i in range(count)]
+
+_CURSOR_UP_CODES = _create_cursor_codes('A')
+_CURSOR_DOWN_CODES = _create_cursor_codes('B')
+_CURSOR_FORWARD_CODES = _create_cursor_codes('C')
+_CURSOR_BACKWARD_CODES = _create_cursor_codes('D')
+
+
 class TerminalCodes:
     """
     Escape codes for a VT100 terminal.
@@ -41,9 +106,18 @@ class TerminalCodes:
     NEWLINE = '\n'
     CRLF = '\r\n'
 
+    #: Go to the start of the current line and erase everything below.
+    CARRIAGE_RETURN_ERASE_DOWN = CARRIAGE_RETURN + ERASE_DOWN
+
     HIDE_CURSOR = '\x1b[?25l'
     DISPLAY_CURSOR = '\x1b[?25h'
 
+    #: Synchronized output. (DEC private mode 2026.) The terminal buffers
+    #: everything in between and paints it at once. Terminals that don't
+    #: support it ignore these codes.
+    BEGIN_SYNCHRONIZED_OUTPUT = '\x1b[?2026h'
+    END_SYNCHRONIZED_OUTPUT = '\x1b[?2026l'
+
     @staticmethod
     def CURSOR_GOTO(row=0, column=0):
         """ Move cursor position. """
@@ -51,66 +125,60 @@ class TerminalCodes:
 
     @staticmethod
     def CURSOR_UP(amount):
-        if amount == 1:
-            return '\x1b[A'
+        if 0 <= amount < 256:
+            return _CURSOR_UP_CODES[amount]
         else:
             return '\x1b[%iA' % amount
 
     @staticmethod
     def CURSOR_DOWN(amount):
-        if amount == 1:
-            return '\x1b[B'
+        if 0 <= amount < 256:
+            return _CURSOR_DOWN_CODES[amount]
         else:
             return '\x1b[%iB' % amount
 
     @staticmethod
     def CURSOR_FORWARD(amount):
-        if amount == 1:
-            return '\x1b[C'
+        if 0 <= amount < 256:
+            return _CURSOR_FORWARD_CODES[amount]
         else:
             return '\x1b[%iC' % amount
 
     @staticmethod
     def CURSOR_BACKWARD(amount):
-        if amount == 1:
-            return '\x1b[D'
+        if 0 <= amount < 256:
+            return _CURSOR_BACKWARD_CODES[amount]
         else:
             return '\x1b[%iD' % amount
 
 
 class Char(object):
-    __slots__ = ('char', 'style')
+    __slots__ = ('char', 'style', 'width')
 
     def __init__(self, char=' ', style=None):
         self.char = char
         self.style = style # TODO: maybe we should still use `token` instead of
                            #       `style` and use the actual style in the last step of the renderer.
 
+        # We use the `max(0, ...` because some non printable control
+        # characters, like e.g. Ctrl-underscore get a -1 wcwidth value.
+        # It can be possible that these characters end up in the input text.
+        self.width = max(0, _char_width(char))
+
     def output(self):
         """ Return the output to write this character to the terminal. """
         style = self.style
 
         if style:
-            e = EscapeSequence(
-                    fg=(_tf._color_index(style['color']) if style['color'] else None),
-                    bg=(_tf._color_index(style['bgcolor']) if style['bgcolor'] else None),
-                    bold=style.get('bold', False),
-                    underline=style.get('underline', False))
-
-            return ''.join([
-                    e.color_string(),
-                    self.char,
-                    e.reset_string()
-                ])
+            color_string, reset_string = _get_escape_codes(style)
+            return color_string + self.char + reset_string
         else:
             return self.char
 
-    @property
-    def width(self):
-        # We use the `max(0, ...` because some non printable control
-        # characters, like e.g. Ctrl-underscore get a -1 wcwidth value.
-        # It can be possible that these characters end up in the input text.
-        return max(0, wcwidth(self.char))
+
+#: Shared default character, used to fill the gaps in the screen buffer.
+#: (Should never be modified.)
+_SPACE = Char()
 
 
 class Screen(object):
@@ -121,8 +189,11 @@ class Screen(object):
     :param grayed: True when all tokes should be replaced by `Token.Aborted`
     """
     def __init__(self, style, columns, grayed=False):
-        self._buffer = defaultdict(lambda: defaultdict(Char))
-        self._cursor_mappings = { } # Map (row, col) of input data to (row, col) screen output.
+        self._buffer = [] # List of rows. Every row is a list of `Char` instances.
+        # Map the row of the input data to a list of (col, y, x, count)
+        # tuples: `count` input characters, starting at input column `col`
+        # are drawn from screen position (y, x) to the right.
+        self._input_positions = { }
         self._x = 0
         self._y = 0
 
@@ -131,11 +202,50 @@ class Screen(object):
 
         self._columns = columns
         self._style = style
+        self._style_cache = { } # Map token to style. (`False` for no style.)
+        self._char_cache = { } # Map token to {char: Char} dict.
         self._grayed = grayed
         self._second_line_prefix_func = None
 
-    def save_input_pos(self):
-        self._cursor_mappings[self._input_row, self._input_col] = (self._y, self._x)
+    def _row(self, y):
+        """
+        Return the list of characters for row y. (Grow the buffer if needed.)
+        """
+        buffer = self._buffer
+
+        if len(buffer) <= y:
+            buffer.extend([] for i in range(y + 1 - len(buffer)))
+
+        return buffer[y]
+
+    def save_input_pos(self, count=1):
+        """
+        Remember that `count` input characters, starting at the current input
+        position, are drawn from the current screen position.
+        """
+        try:
+            runs = self._input_positions[self._input_row]
+        except KeyError:
+            runs = self._input_positions[self._input_row] = []
+
+        # Extend the previous run when this continues it.
+        if runs:
+            col, y, x, n = runs[-1]
+            if col + n == self._input_col and y == self._y and x + n == self._x:
+                runs[-1] = (col, y, x, n + count)
+                return
+
+        runs.append((self._input_col, self._y, self._x, count))
+
+    def get_screen_pos(self, row, col):
+        """
+        Return the (y, x) screen position where the character at the input
+        position (row, col) has been drawn. (`None` if it was not drawn.)
+        """
+        # When a position was saved several times, the last one counts.
+        for c, y, x, n in reversed(self._input_positions.get(row, ())):
+            if c <= col < c + n:
+                return y, x + col - c
 
     def set_second_line_prefix(self, func):
         """
@@ -150,7 +260,7 @@ class Screen(object):
         """
         assert len(char) == 1
 
-        char_width = wcwidth(char)
+        char_width = _char_width(char)
 
         # In case of a double width character, if there is no more place left
         # at this line, go first to the following line.
@@ -192,20 +302,171 @@ class Screen(object):
             else:
                 self._x += char_width
 
-    def write_at_pos(self, y, x, char, token):
+    def write_token_text(self, token, text, is_input=True):
         """
-        Write character at position (y, x).
-        (Truncate when character is outside margin.)
+        Write text to current cursor position and move cursor.
+        (Like calling `write_char` for every character, but the style is only
+        looked up once.)
+        """
+        # If grayed, replace token
+        if self._grayed:
+            token = Token.Aborted
+
+        columns = self._columns
+
+        for i, part in enumerate(text.split('\n')):
+            # Newlines (and the second line prefix) are handled by `write_char`.
+            if i:
+                self.write_char('\n', token, is_input=is_input)
+
+            if columns > 1 and _printable_ascii_re.match(part):
+                self._write_ascii(part, token, is_input)
+            else:
+                self._write_text(part, token, is_input)
+
+    def _write_text(self, text, token, is_input):
+        """
+        Write text without newlines, one character at a time.
+        """
+        chars = self._get_chars(token)
+        columns = self._columns
+
+        for char in text:
+            char_width = _char_width(char)
+
+            # In case of a double width character, if there is no more place
+            # left at this line, go first to the following line.
+            if self._x + char_width >= columns:
+                self._y += 1
+                self._x = 0
+
+            # Remember at which position this input character has been drawn.
+            if is_input:
+                self.save_input_pos()
+                self._input_col += 1
+
+            try:
+                c = chars[char]
+            except KeyError:
+                c = chars[char] = Char(char=char, style=self._get_style(token))
+
+            self._set_char(self._y, self._x, c)
+
+            # Move cursor position
+            if self._x + char_width >= columns:
+                self._y += 1
+                self._x = 0
+            else:
+                self._x += char_width
+
+    def _write_ascii(self, text, token, is_input):
+        """
+        Write text that consists only of printable ASCII characters. Because
+        every character is one column wide, we can write everything up to the
+        right margin at once.
+        """
+        chars = self._get_chars(token)
+        columns = self._columns
+
+        for c in set(text):
+            if c not in chars:
+                self._get_char(c, token)
+
+        i = 0
+        while i < len(text):
+            if self._x + 1 >= columns:
+                self._y += 1
+                self._x = 0
+
+            y, x = self._y, self._x
+            n = min(len(text) - i, columns - 1 - x)
+
+            # Remember at which positions these input characters have been
+            # drawn.
+            if is_input:
+                self.save_input_pos(n)
+                self._input_col += n
+
+            self._set_chars(y, x, [chars[c] for c in text[i:i + n]])
+            self._x += n
+            i += n
+
+    def _get_style(self, token):
+        """
+        Return the style for this token. (`False` when there is no style.)
+        """
+        style = self._style_cache.get(token)
+
+        if style is None:
+            try:
+                style = self._style.style_for_token(token)
+            except KeyError:
+                style = False
+            self._style_cache[token] = style
+
+        return style
+
+    def _get_chars(self, token):
+        """
+        Return the {char: Char} dictionary for this token. The `Char`
+        instances are shared, so they should never be modified.
         """
-        # Get style
         try:
-            style = self._style.style_for_token(token)
+            return self._char_cache[token]
         except KeyError:
-            style = None
+            result = self._char_cache[token] = { }
+            return result
+
+    def _get_char(self, char, token):
+        """
+        Return the (shared) `Char` instance for this character and token.
+        """
+        chars = self._get_chars(token)
+
+        try:
+            return chars[char]
+        except KeyError:
+            result = chars[char] = Char(char=char, style=self._get_style(token))
+            return result
+
+    def _set_char(self, y, x, char):
+        """
+        Put the `Char` instance at position (y, x).
+        (Truncate when character is outside margin.)
+        """
+        # (x can be negative after characters with a negative width. These
+        # positions are never displayed.)
+        if y < self._columns and x >= 0:
+            row = self._row(y)
+
+            if len(row) <= x:
+                row.extend([_SPACE] * (x + 1 - len(row)))
+
+            row[x] = char
+
+    def _set_chars(self, y, x, chars):
+        """
+        Put a list of `Char` instances, starting at position (y, x).
+        (Truncate when character is outside margin.)
+        """
+        if x < 0:
+            chars = chars[-x:]
+            x = 0
 
-        # Add char to buffer
         if y < self._columns:
-            self._buffer[y][x] = Char(char=char, style=style)
+            row = self._row(y)
+
+            if len(row) < x:
+                row.extend([_SPACE] * (x - len(row)))
+
+            row[x:x + len(chars)] = chars
+
+    def write_at_pos(self, y, x, char, token):
+        """
+        Write character at position (y, x).
+        (Truncate when character is outside margin.)
+        """
+        self._set_char(y, x, self._get_char(char, token))
 
     def write_highlighted_at_pos(self, y, x, data):
         """
@@ -214,21 +475,20 @@ class Screen(object):
         """
         for token, text in data:
             for c in text:
-                self.write_at_pos(y, x, c, token)
-                x += wcwidth(c)
+                self._set_char(y, x, self._get_char(c, token))
+                x += _char_width(c)
 
     def write_highlighted(self, data, is_input=True):
         """
         Write (Token, text) tuples to the screen.
         """
         for token, text in data:
-            for c in text:
-                self.write_char(c, token=token, is_input=is_input)
+            self.write_token_text(token, text, is_input=is_input)
 
     def highlight_line(self, row, bgcolor='f8f8f8'):
-        for (y, x), (screen_y, screen_x) in self._cursor_mappings.items():
-            if y == row:
-                self.highlight_character(y, x, bgcolor=bgcolor)
+        for col, y, x, n in self._input_positions.get(row, ()):
+            for i in range(col, col + n):
+                self.highlight_character(row, i, bgcolor=bgcolor)
 
     def highlight_character(self, row, column, bgcolor=None, color=None):
         """
@@ -237,44 +497,95 @@ class Screen(object):
         """
         # We can only highlight this row/column when this position has been
         # drawn to the screen. Only then we know the absolute position.
-        if (row, column) in self._cursor_mappings:
-            screen_y, screen_x = self._cursor_mappings[row, column]
+        pos = self.get_screen_pos(row, column)
+
+        if pos is not None:
+            screen_y, screen_x = pos
 
             # Only highlight if we have this character in the buffer.
-            if screen_x in self._buffer[screen_y]:
-                c = self._buffer[screen_y][screen_x]
+            if screen_y < len(self._buffer) and 0 <= screen_x < len(self._buffer[screen_y]):
+                row = self._buffer[screen_y]
+                c = row[screen_x]
+
+                # Don't modify `c` or its style. `Char` instances and style
+                # dicts are shared between all the characters with the same
+                # token.
                 if c.style:
-                    if bgcolor: c.style['bgcolor'] = bgcolor
-                    if color: c.style['color'] = color
+                    style = dict(c.style)
+                    if bgcolor: style['bgcolor'] = bgcolor
+                    if color: style['color'] = color
                 else:
-                    c.style = {
+                    style = {
                             'bgcolor': bgcolor,
                             'color': color,
                             }
+                row[screen_x] = Char(char=c.char, style=style)
 
     def output(self):
         """
         Return (string, last_y, last_x) tuple.
         """
-        result = []
+        lines = self.output_lines()
+
+        if lines:
+            return (TerminalCodes.CRLF.join(line for line, width in lines),
+                    len(lines) - 1, lines[-1][1])
+        else:
+            return '', 0, 0
+
+    def output_lines(self):
+        """
+        Return a list of (string, width) tuples, one for every row.
+
+        Escape sequences are only inserted where the style changes, not
+        around every character.
+        """
+        lines = []
+
+        for row in self._buffer:
+            result = []
+            append = result.append
+
+            cols = len(row)
+            style = None
+            reset_string = ''
 
-        rows = max(self._buffer.keys()) + 1
-        c = 0
+            c = 0
+            while c < cols:
+                char = row[c]
 
-        for y, r in enumerate(range(0, rows)):
-            line_data = self._buffer[r]
-            if line_data:
-                cols = max(line_data.keys()) + 1
+                # Gap in the buffer. Write the whole run of blanks at once.
+                if char is _SPACE:
+                    end = c + 1
+                    while end < cols and row[end] is _SPACE:
+                        end += 1
 
-                c = 0
-                while c < cols:
-                    result.append(line_data[c].output())
-                    c += (line_data[c].width or 1)
+                    if style:
+                        append(reset_string)
+                    style = None
+                    reset_string = ''
 
-            if y != rows - 1:
-                result.append(TerminalCodes.CRLF)
+                    append(' ' * (end - c))
+                    c = end
+                    continue
 
-        return ''.join(result), y, c
+                if char.style != style:
+                    append(reset_string)
+                    style = char.style
+
+                    if style:
+                        color_string, reset_string = _get_escape_codes(style)
+                        append(color_string)
+                    else:
+                        reset_string = ''
+
+                append(char.char)
+                c += (char.width or 1)
+
+            append(reset_string)
+            lines.append((''.join(result), c))
+
+        return lines
 
 
 class _CompletionMenu(object):
@@ -290,11 +601,11 @@ class _CompletionMenu(object):
         """
         Return the position of the menu.
         We calculate this by mapping the cursor position (from the
-        complete_state) in the _cursor_mappings of the screen object.
+        complete_state) to a screen position.
         """
-        return self.screen._cursor_mappings[
-                (self.complete_state.original_document.cursor_position_row,
-                 self.complete_state.original_document.cursor_position_col)]
+        return self.screen.get_screen_pos(
+                self.complete_state.original_document.cursor_position_row,
+                self.complete_state.original_document.cursor_position_col)
 
     def write(self):
         """
@@ -357,6 +668,10 @@ class Renderer(object):
 
     screen_cls = Screen
 
+    #: Wrap every redraw in synchronized output escape sequences, to avoid
+    #: flickering.
+    synchronized_output = True
+
     def __init__(self, stdout=None, style=None):
         self._stdout = (stdout or sys.stdout)
         self._style = style or Style
@@ -364,9 +679,34 @@ class Renderer(object):
         # Reset position
         self._cursor_line = 0
 
+        # Terminal (rows, columns). (Cached until `reset_size` is called.)
+        self._size = None
+
+        # The rows of the previous output, as returned by
+        # `Screen.output_lines`. Only the rows that changed are drawn again.
+        # (`None` when everything has to be drawn.)
+        self._last_lines = None
+
+    def _get_size(self):
+        if self._size is None:
+            self._size = get_size(self._stdout.fileno())
+        return self._size
+
     def get_width(self):
-        rows, cols = get_size(self._stdout.fileno())
-        return cols
+        return self._get_size()[1]
+
+    def get_height(self):
+        return self._get_size()[0]
+
+    def reset_size(self):
+        """
+        Forget the cached terminal size. Call this when the terminal has been
+        resized. (On SIGWINCH.)
+        """
+        self._size = None
+
+        # The terminal can have rewrapped the previous output.
+        self._last_lines = None
 
     def  _get_new_screen(self, render_context):
         """
@@ -391,7 +731,7 @@ class Renderer(object):
         if not (render_context.accept or render_context.abort):
             help_tokens = render_context.prompt.get_help_tokens()
             if help_tokens:
-                screen.write_highlighted(help_tokens)
+                screen.write_highlighted(help_tokens, is_input=False)
 
         # Highlight current line.
         if self.highlight_current_line and not (render_context.accept or render_context.abort):
@@ -413,30 +753,67 @@ class Renderer(object):
         output = []
         write = output.append
 
-        # Move the cursor to the first line that was printed before
-        # and erase everything below it.
-        if self._cursor_line:
-            write(TerminalCodes.CURSOR_UP(self._cursor_line))
-
-        write(TerminalCodes.CARRIAGE_RETURN)
-        write(TerminalCodes.ERASE_DOWN)
+        if self.synchronized_output:
+            write(TerminalCodes.BEGIN_SYNCHRONIZED_OUTPUT)
 
         # Generate the output of the new screen.
         screen = self._get_new_screen(render_context)
-        o, last_y, last_x = screen.output()
-        write(o)
+        lines = screen.output_lines()
+
+        # Rows that don't fit in the terminal (the completion menu can be
+        # wider than the screen) are wrapped by the terminal, and when there
+        # are more rows than the terminal height, the first rows scroll out of
+        # the screen. Then the rows don't correspond with the lines in the
+        # terminal anymore, and we have to draw everything.
+        columns = self.get_width()
+        if (len(lines) >= self.get_height() or
+                any(width >= columns for line, width in lines)):
+            self._last_lines = None
+            keep_lines = False
+        else:
+            keep_lines = True
+
+        # After accept or abort, the cursor has to end up below the last row
+        # (where the output of the command starts), so draw everything.
+        if render_context.accept or render_context.abort:
+            self._last_lines = None
+
+        if self._last_lines is None:
+            # Move the cursor to the first line that was printed before
+            # and erase everything below it.
+            if self._cursor_line:
+                write(TerminalCodes.CURSOR_UP(self._cursor_line))
+
+            write(TerminalCodes.CARRIAGE_RETURN_ERASE_DOWN)
+            write(TerminalCodes.CRLF.join(line for line, width in lines))
+
+            if lines:
+                last_y, last_x = len(lines) - 1, lines[-1][1]
+            else:
+                last_y, last_x = 0, 0
+        else:
+            last_y, last_x = self._write_changed_lines(write, lines)
 
         # Move cursor to correct position.
         if render_context.accept or render_context.abort:
             self._cursor_line = 0
+            self._last_lines = None
             write(TerminalCodes.CRLF)
         else:
-            cursor_y, cursor_x = screen._cursor_mappings[
+            cursor_y, cursor_x = screen.get_screen_pos(
                             render_context.code_obj.document.cursor_position_row,
-                            render_context.code_obj.document.cursor_position_col]
+                            render_context.code_obj.document.cursor_position_col)
 
-            if last_y - cursor_y:
+            if last_y > cursor_y:
                 write(TerminalCodes.CURSOR_UP(last_y - cursor_y))
+            if last_y < cursor_y:
+                write(TerminalCodes.CURSOR_DOWN(cursor_y - last_y))
+
+            if last_x is None:
+                # Unknown column, start from the left.
+                write(TerminalCodes.CARRIAGE_RETURN)
+                last_x = 0
+
             if last_x > cursor_x:
                 write(TerminalCodes.CURSOR_BACKWARD(last_x - cursor_x))
             if last_x < cursor_x:
@@ -444,20 +821,86 @@ class Renderer(object):
 
             self._cursor_line = cursor_y
 
+            # (When the cursor is below the last row, the terminal can have
+            # scrolled.)
+            if keep_lines and cursor_y < len(lines):
+                self._last_lines = lines
+            else:
+                self._last_lines = None
+
+        if self.synchronized_output:
+            write(TerminalCodes.END_SYNCHRONIZED_OUTPUT)
+
         return ''.join(output)
 
+    def _write_changed_lines(self, write, lines):
+        """
+        Draw only the rows that are different from the previous output, and
+        erase the rows that are no longer used.
+
+        Return the (y, x) position of the cursor afterwards. (x is `None` when
+        the column is unknown.)
+        """
+        previous = self._last_lines
+        y = self._cursor_line
+        x = None
+        bottom = len(previous) - 1 # Last row that exists in the terminal.
+
+        for i, line in enumerate(lines):
+            if i < len(previous) and line == previous[i]:
+                continue
+
+            # Go to row i.
+            if i <= bottom:
+                if i < y:
+                    write(TerminalCodes.CURSOR_UP(y - i))
+                elif i > y:
+                    write(TerminalCodes.CURSOR_DOWN(i - y))
+            else:
+                # This row doesn't exist yet. Go to the last row, and add
+                # newlines. (Moving the cursor down doesn't scroll.)
+                if bottom > y:
+                    write(TerminalCodes.CURSOR_DOWN(bottom - y))
+
+                write(TerminalCodes.CRLF * (i - bottom))
+                bottom = i
+
+            text, width = line
+            write(TerminalCodes.CARRIAGE_RETURN)
+            write(text)
+            write(TerminalCodes.ERASE_END_OF_LINE)
+            y, x = i, width
+
+        # Erase the rows below the new output.
+        if len(lines) < len(previous):
+            i = len(lines)
+
+            if i < y:
+                write(TerminalCodes.CURSOR_UP(y - i))
+            elif i > y:
+                write(TerminalCodes.CURSOR_DOWN(i - y))
+
+            write(TerminalCodes.CARRIAGE_RETURN_ERASE_DOWN)
+            y, x = i, 0
+
+        return y, x
+
     def render(self, render_context):
         out = self._render_to_str(render_context)
         self._stdout.write(out)
         self._stdout.flush()
 
     def render_completions(self, completions):
-        self._stdout.write(TerminalCodes.CRLF)
-        for line in self._in_columns([ c.display for c in completions ]):
-            self._stdout.write('%s\r\n' % line)
+        # Write all the lines at once.
+        lines = list(self._in_columns([ c.display for c in completions ]))
+        lines.append('')
+
+        self._stdout.write(TerminalCodes.CRLF + TerminalCodes.CRLF.join(lines))
+        self._stdout.flush()
 
         # Reset position
         self._cursor_line = 0
+        self._last_lines = None
 
         return
         if many: # TODO: Implement paging
@@ -467,8 +910,10 @@ class Renderer(object):
         """
         Clear screen and go to 0,0
         """
-        self._stdout.write(TerminalCodes.ERASE_SCREEN)
-        self._stdout.write(TerminalCodes.CURSOR_GOTO(0, 0))
+        self._stdout.write(TerminalCodes.ERASE_SCREEN + TerminalCodes.CURSOR_GOTO(0, 0))
+        self._stdout.flush()
+
+        self._last_lines = None
 
     def _in_columns(self, item_iterator, margin_left=0): # XXX: copy of deployer.console.in_columns
         """
@@ -489,7 +934,11 @@ class Renderer(object):
             return
 
         # Calculate the longest.
-        max_length = max(map(get_length, all_items)) + 1
+        lengths = [get_length(item) for item in all_items]
+        max_length = max(lengths) + 1
+
+        # Padding after an item, indexed by the length of the item.
+        paddings = [' ' * (max_length - l) for l in range(max_length + 1)]
 
         # World per line?
         term_width = self.get_width() - margin_left
@@ -498,7 +947,7 @@ class Renderer(object):
         # Iterate through items.
         margin = ' ' * margin_left
         line = [ margin ]
-        for i, j in enumerate(all_items):
+        for i, (j, length) in enumerate(zip(all_items, lengths)):
             # Print command and spaces
             line.append(get_text(j))
 
@@ -508,6 +957,6 @@ class Renderer(object):
                 line = [ margin ]
             else:
                 # Pad with whitespace
-                line.append(' ' * (max_length - get_length(j)))
+                line.append(paddings[length])
 
         yield ''.join(line)
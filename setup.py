@@ -1,7 +1,22 @@
 #!/usr/bin/env python
+import os
 from setuptools import setup, find_packages
 
 
+# Optionally compile the modules on the keystroke hot path with Cython.
+# (Set PROMPT_TOOLKIT_CYTHON=1 when building.) The pure Python modules are
+# always installed, so they remain the fallback when the extensions are not
+# available.
+if os.environ.get('PROMPT_TOOLKIT_CYTHON'):
+    from Cython.Build import cythonize
+    ext_modules = cythonize([
+            'prompt_toolkit/line.py',
+            'prompt_toolkit/contrib/repl.py',
+        ], compiler_directives={'language_level': 3})
+else:
+    ext_modules = []
+
+
 setup(
         name='prompt_toolkit',
         author='Jonathan Slenders',
@@ -12,6 +27,7 @@ setup(
         description='',
         long_description='',
         packages=find_packages('.'),
+        ext_modules=ext_modules,
         install_requires = [
             'pygments', 'docopt', 'six',
 
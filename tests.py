@@ -5,7 +5,7 @@ import unittest
 import six
 
 from prompt_toolkit.inputstream import InputStream
-from prompt_toolkit.line import Line, Document, ReturnInput
+from prompt_toolkit.line import Line, Document, ReturnInput, ClipboardData
 
 
 class _CLILogger(object):
@@ -139,6 +139,18 @@ class LineTest(unittest.TestCase):
         self.assertEqual(self.cli.text, 'some_teAxt')
         self.assertEqual(self.cli.cursor_position, len('some_teA'))
 
+    def test_cursor_movement_count(self):
+        self.cli.insert_text('some\ntext')
+        self.cli.cursor_left(3)
+        self.assertEqual(self.cli.cursor_position, len('some\nt'))
+
+        # Don't move beyond the start or the end of the line.
+        self.cli.cursor_left(10)
+        self.assertEqual(self.cli.cursor_position, len('some\n'))
+
+        self.cli.cursor_right(10)
+        self.assertEqual(self.cli.cursor_position, len('some\ntext'))
+
     def test_home_end(self):
         self.cli.insert_text('some_text')
         self.cli.home()
@@ -209,6 +221,39 @@ class LineTest(unittest.TestCase):
         self.assertEqual(self.cli.text, 'hello word3')
         self.assertEqual(self.cli.cursor_position, len('hello '))
 
+    def test_delete_word_count(self):
+        self.cli.insert_text('hello world word3 word4')
+        self.cli.home()
+        self.cli.cursor_word_forward()
+        deleted = self.cli.delete_word(count=2)
+
+        self.assertEqual(deleted, 'world word3 ')
+        self.assertEqual(self.cli.text, 'hello word4')
+
+        # Delete until the end when there are not enough words.
+        self.assertEqual(self.cli.delete_word(count=3), 'word4')
+        self.assertEqual(self.cli.text, 'hello ')
+
+    def test_delete_word_before_cursor(self):
+        self.cli.insert_text('hello world word3')
+        deleted = self.cli.delete_word_before_cursor(count=2)
+
+        self.assertEqual(deleted, 'world word3')
+        self.assertEqual(self.cli.text, 'hello ')
+        self.assertEqual(self.cli.cursor_position, len('hello '))
+
+        self.cli.home()
+        self.assertEqual(self.cli.delete_word_before_cursor(), '')
+
+    def test_paste_from_clipboard_count(self):
+        self.cli.insert_text('ab')
+        self.cli.home()
+        self.cli.set_clipboard(ClipboardData('xy'))
+        self.cli.paste_from_clipboard(count=3)
+
+        self.assertEqual(self.cli.text, 'axyxyxyb')
+        self.assertEqual(self.cli.cursor_position, len('axyxyx'))
+
     def test_delete_until_end(self):
         self.cli.insert_text('this is a sentence.')
         self.cli.home()
@@ -441,6 +486,202 @@ class DocumentTest(unittest.TestCase):
         self.assertEqual(doc2.cursor_at_the_end, True)
 
 
+from prompt_toolkit.inputstream_handler import InputStreamHandler, EmacsInputStreamHandler, ViInputStreamHandler
+
+class InputStreamHandlerTest(unittest.TestCase):
+    def setUp(self):
+        self.line = Line()
+        self.handler = InputStreamHandler(self.line)
+
+    def test_dispatch(self):
+        self.handler('insert_char', 'a')
+        self.handler('insert_char', 'b')
+        self.handler('ctrl_a')
+        self.handler('ctrl_t')
+        self.assertEqual(self.line.text, 'ab')
+        self.assertEqual(self.line.cursor_position, 0)
+
+        self.handler('ctrl_e')
+        self.handler('ctrl_t')
+        self.assertEqual(self.line.text, 'ba')
+        self.assertEqual(self.handler._last_call, 'ctrl_t')
+
+    def test_unknown_handler(self):
+        self.handler('insert_char', 'a')
+        self.handler('unknown')
+        self.assertEqual(self.line.text, 'a')
+        self.assertEqual(self.handler._last_call, 'unknown')
+
+    def test_no_op_handler(self):
+        self.assertIsNone(self.handler._handlers['ctrl_q'])
+
+        self.handler('insert_char', 'a')
+        self.handler('ctrl_q')
+        self.assertEqual(self.line.text, 'a')
+        self.assertEqual(self.handler._last_call, 'ctrl_q')
+
+    def test_private_names(self):
+        self.handler('insert_char', 'a')
+        self.handler('_set_arg_count', 3)
+        self.assertEqual(self.handler._arg_count, 3)
+
+        # Private handlers don't count as the last call.
+        self.assertEqual(self.handler._last_call, 'insert_char')
+
+    def test_subclass_handler(self):
+        class Handler(InputStreamHandler):
+            def ctrl_q(self):
+                self._line.insert_text('!')
+
+        handler = Handler(self.line)
+        handler('ctrl_q')
+        self.assertEqual(self.line.text, '!')
+
+
+class EmacsInputStreamHandlerTest(unittest.TestCase):
+    def setUp(self):
+        self.line = Line()
+        self.handler = EmacsInputStreamHandler(self.line)
+
+    def feed(self, text):
+        for c in text:
+            self.handler('insert_char', c)
+
+    def test_meta_char(self):
+        self.feed('hello world')
+        self.handler('ctrl_a')
+        self.handler('escape')
+        self.feed('u')
+        self.assertEqual(self.line.text, 'HELLO world')
+        self.assertEqual(self.handler._last_call, 'meta_u')
+
+        self.handler('escape')
+        self.feed('b')
+        self.assertEqual(self.line.cursor_position, 0)
+
+    def test_meta_key(self):
+        self.feed('hello world')
+        self.handler('escape')
+        self.handler('backspace')
+        self.assertEqual(self.line.text, 'hello ')
+
+    def test_meta_digit(self):
+        self.handler('escape')
+        self.feed('3')
+        self.feed('x')
+        self.assertEqual(self.line.text, 'xxx')
+        self.assertIsNone(self.handler._arg_count)
+
+    def test_unknown_meta_char(self):
+        self.handler('escape')
+        self.feed('z')
+        self.feed('a')
+        self.assertEqual(self.line.text, 'a')
+
+    def test_ctrl_x(self):
+        self.feed('hello')
+        self.handler('ctrl_a')
+        self.handler('ctrl_x')
+        self.handler('ctrl_x')
+        self.assertEqual(self.line.cursor_position, 5)
+
+        self.feed(' world')
+        self.handler('ctrl_x')
+        self.handler('ctrl_u')
+        self.assertEqual(self.line.text, 'hello')
+
+        # Without the prefix, Ctrl-U clears the line.
+        self.handler('ctrl_u')
+        self.assertEqual(self.line.text, '')
+
+
+class ViInputStreamHandlerTest(unittest.TestCase):
+    def setUp(self):
+        self.line = Line()
+        self.handler = ViInputStreamHandler(self.line)
+
+    def feed(self, text):
+        for c in text:
+            self.handler('insert_char', c)
+
+    def test_navigation(self):
+        self.feed('abc def ghi\nline2')
+        self.handler('escape')
+        self.feed('k0')
+        self.assertEqual(self.line.cursor_position, 0)
+
+        self.feed('3x')
+        self.assertEqual(self.line.text, ' def ghi\nline2')
+
+        self.feed('wcw')
+        self.feed('X')
+        self.handler('escape')
+        self.assertEqual(self.line.text, ' Xghi\nline2')
+
+    def test_pending_prefix(self):
+        self.feed('line1\nline2')
+        self.handler('escape')
+
+        # After 'd', the handler waits for the next key.
+        self.feed('d')
+        self.assertEqual(self.line.text, 'line1\nline2')
+        self.assertIsNot(self.handler._current_handles,
+                         self.handler._all_navigation_handles)
+
+        self.feed('d')
+        self.assertEqual(self.line.text, 'line1')
+        self.assertIs(self.handler._current_handles,
+                      self.handler._all_navigation_handles)
+
+        self.feed('>>')
+        self.assertEqual(self.line.text, '    line1')
+
+        # An unknown key sequence is ignored, and starts over.
+        self.feed('dz')
+        self.assertEqual(self.line.text, '    line1')
+        self.feed('0x')
+        self.assertEqual(self.line.text, '   line1')
+
+    def test_macro_record_and_replay(self):
+        self.feed('abcdef')
+        self.handler('escape')
+        self.line.cursor_position = 0
+
+        # Record 'x' in register 'a', then replay it.
+        self.feed('qaxq')
+        self.assertEqual(self.line.text, 'bcdef')
+        self.assertEqual(self.handler._macros['a'], [('insert_char', 'x')])
+
+        self.feed('@a')
+        self.assertEqual(self.line.text, 'cdef')
+        self.assertFalse(self.handler.is_recording_macro)
+
+        # The next key is not swallowed by a pending callback.
+        self.feed('x')
+        self.assertEqual(self.line.text, 'def')
+
+    def test_subclass_handles(self):
+        def insert_exclamation_mark(handler, line, arg):
+            line.insert_text('!')
+
+        class Handler(ViInputStreamHandler):
+            def _get_navigation_mode_handles(self):
+                handles = super(Handler, self)._get_navigation_mode_handles()
+                handles['x'] = insert_exclamation_mark
+                return handles
+
+        line = Line()
+        handler = Handler(line)
+        handler('insert_char', 'a')
+        handler('escape')
+        handler('insert_char', 'x')
+        self.assertEqual(line.text, '!a')
+
+        # The key bindings of other handlers are not affected.
+        self.assertIsNot(self.handler._get_navigation_mode_handles()['x'],
+                         insert_exclamation_mark)
+
+
 from prompt_toolkit.code import Code
 from prompt_toolkit.prompt import Prompt
 
@@ -473,6 +714,178 @@ class PromptTest(unittest.TestCase):
         self._test_token_text_list(result)
 
 
+from prompt_toolkit.history import History, FileHistory
+
+import os
+import shutil
+import tempfile
+
+class HistoryTest(unittest.TestCase):
+    def test_slice(self):
+        history = History()
+        for i in range(4):
+            history.append('line%i' % i)
+
+        self.assertEqual(history[1:3], ['line1', 'line2'])
+        self.assertEqual(history[-2:], ['line2', 'line3'])
+        self.assertEqual(history[::-2], ['line3', 'line1'])
+        self.assertEqual(history[-1], 'line3')
+
+
+class FileHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'history')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_missing_file(self):
+        history = FileHistory(self.filename)
+        self.assertEqual(len(history), 0)
+
+    def test_load(self):
+        history = FileHistory(self.filename)
+        history.append('line1')
+        history.append('line2\n\n  line3')
+        history.append('')
+        history.close()
+
+        history = FileHistory(self.filename)
+        self.assertEqual(len(history), 3)
+        self.assertEqual(history[0], 'line1')
+        self.assertEqual(history[1], 'line2\n\n  line3')
+        self.assertEqual(history[2], '')
+
+    def test_unwritable_file(self):
+        history = FileHistory(os.path.join(self.directory, 'missing', 'history'))
+        self.assertRaises(IOError, history.append, 'line1')
+
+    def test_max_size(self):
+        class SmallHistory(FileHistory):
+            max_size = 2
+
+        history = SmallHistory(self.filename)
+        for i in range(3):
+            history.append('line%i' % i)
+        history.close()
+        self.assertEqual(list(history.strings), ['line1', 'line2'])
+
+        # Only the most recent entries are loaded from the file.
+        history = SmallHistory(self.filename)
+        self.assertEqual(list(history.strings), ['line1', 'line2'])
+
+
+from prompt_toolkit.renderer import Renderer, TerminalCodes
+from pygments.token import Token
+
+import io
+
+class _TestRenderer(Renderer):
+    """ Renderer with a fixed terminal size, writing to a string. """
+    def get_width(self):
+        return 40
+
+    def get_height(self):
+        return 20
+
+
+class _ToolbarPrompt(Prompt):
+    def get_help_tokens(self):
+        return [(Token, '\n'), (Token.Toolbar, 'toolbar')]
+
+
+class RendererTest(unittest.TestCase):
+    def _render_accept(self, prompt_cls=Prompt):
+        """
+        Render the input 'abc\ndef\nghi' with the cursor on the first row,
+        then render the accepted input. Return the output of both renderers:
+        the one that has drawn before, and a fresh one.
+        """
+        renderer = _TestRenderer(stdout=io.StringIO())
+        line = Line(renderer=renderer, prompt_cls=prompt_cls)
+        line.insert_text('abc\ndef\nghi')
+        line.cursor_position = 1
+
+        renderer.render(line.get_render_context())
+        renderer.render(line.get_render_context())
+        cursor_line = renderer._cursor_line
+
+        result = renderer._render_to_str(line.get_render_context(_accept=True))
+
+        # A renderer that draws everything, starting from the same row.
+        fresh = _TestRenderer(stdout=io.StringIO())
+        fresh._cursor_line = cursor_line
+        expected = fresh._render_to_str(line.get_render_context(_accept=True))
+
+        return result, expected
+
+    def test_render_twice(self):
+        renderer = _TestRenderer(stdout=io.StringIO())
+        line = Line(renderer=renderer)
+        line.insert_text('abc')
+
+        renderer._render_to_str(line.get_render_context())
+
+        # Nothing changed, so only the cursor is positioned again.
+        result = renderer._render_to_str(line.get_render_context())
+        self.assertNotIn('abc', result)
+        self.assertNotIn(TerminalCodes.ERASE_DOWN, result)
+
+    def test_accept_cursor_not_on_last_row(self):
+        result, expected = self._render_accept()
+
+        # All the rows are drawn again, and the cursor ends below the input.
+        self.assertEqual(result, expected)
+        self.assertIn('def', result)
+        self.assertIn('ghi', result)
+        self.assertTrue(result.endswith(TerminalCodes.CRLF +
+                                        TerminalCodes.END_SYNCHRONIZED_OUTPUT))
+
+    def test_accept_with_toolbar(self):
+        result, expected = self._render_accept(_ToolbarPrompt)
+
+        # The toolbar is erased, and no empty line is added.
+        self.assertEqual(result, expected)
+        self.assertNotIn('toolbar', result)
+        self.assertEqual(result.count(TerminalCodes.CRLF), 3)
+
+
+from prompt_toolkit.renderer import Screen
+from pygments.style import Style
+
+class ScreenTest(unittest.TestCase):
+    def _compare_with_write_text(self, parts, columns=10):
+        """
+        Write the parts through `write_token_text` (which uses the ASCII fast
+        path where possible), and one character at a time. The screens should
+        be the same.
+        """
+        screen = Screen(Style, columns)
+        expected = Screen(Style, columns)
+
+        for text in parts:
+            screen.write_token_text(Token, text)
+            expected._write_text(text, Token, True)
+
+        self.assertEqual(screen.output_lines(), expected.output_lines())
+        self.assertEqual((screen._y, screen._x), (expected._y, expected._x))
+        self.assertEqual(screen._input_col, expected._input_col)
+
+        for col in range(screen._input_col + 1):
+            self.assertEqual(screen.get_screen_pos(0, col),
+                             expected.get_screen_pos(0, col))
+
+    def test_ascii_across_margin(self):
+        self._compare_with_write_text(['abcdefghijklmnopqrstuvwxyz'])
+        self._compare_with_write_text(['abcdefg', 'hijklmn', 'opq'])
+        self._compare_with_write_text(['abcdefghi', 'j'])
+
+    def test_ascii_after_wide_chars(self):
+        self._compare_with_write_text(['\u4e2d\u6587', 'abcdefghijklmnop'])
+        self._compare_with_write_text(['abcdefg', '\u4e2d\u6587\u4e2d', 'abcdefg'])
+
+
 #--
 
 
@@ -612,6 +1025,125 @@ class LiteralTest(unittest.TestCase):
         self.assertEqual(len(result), 0)
 
 
+from prompt_toolkit.contrib.repl import PythonLine
+
+class PythonLineTest(unittest.TestCase):
+    def setUp(self):
+        self.line = PythonLine()
+
+    def has_unclosed_brackets(self, text):
+        self.line.reset()
+        self.line.insert_text(text)
+        return self.line._has_unclosed_brackets()
+
+    def test_unclosed_brackets(self):
+        self.assertTrue(self.has_unclosed_brackets('f('))
+        self.assertTrue(self.has_unclosed_brackets('f(a, [1, 2]'))
+        self.assertTrue(self.has_unclosed_brackets('{"a": (1,\n'))
+        self.assertTrue(self.has_unclosed_brackets(')('))
+
+    def test_closed_brackets(self):
+        self.assertFalse(self.has_unclosed_brackets('a = 1'))
+        self.assertFalse(self.has_unclosed_brackets('f(a, [1, 2])'))
+        self.assertFalse(self.has_unclosed_brackets('{"a": (1, 2)}'))
+
+    def test_mismatched_brackets(self):
+        # Enter should execute these, and show the SyntaxError.
+        self.assertFalse(self.has_unclosed_brackets('(]'))
+        self.assertFalse(self.has_unclosed_brackets('{a)'))
+        self.assertFalse(self.has_unclosed_brackets('[)'))
+        self.assertFalse(self.has_unclosed_brackets('f([1)'))
+
+        # Brackets opened after the mismatch still count.
+        self.assertTrue(self.has_unclosed_brackets('(] + ('))
+
+    def test_brackets_in_strings(self):
+        self.assertFalse(self.has_unclosed_brackets('f("(")'))
+        self.assertFalse(self.has_unclosed_brackets("f('\\'(')"))
+        self.assertTrue(self.has_unclosed_brackets('f(")"'))
+
+        # An unterminated string ends at the end of the line.
+        self.assertTrue(self.has_unclosed_brackets('"abc\nf('))
+
+        # Triple quoted strings can span several lines.
+        self.assertFalse(self.has_unclosed_brackets('x = """\nfoo(\n"""'))
+        self.assertFalse(self.has_unclosed_brackets("x = '''\n(\n'''"))
+        self.assertTrue(self.has_unclosed_brackets('x = """\n)"""\nf('))
+        self.assertTrue(self.has_unclosed_brackets('f("""\n"""'))
+
+
+from prompt_toolkit.contrib.repl import PythonCode
+from pygments.lexers import TextLexer
+
+class PythonCodeTest(unittest.TestCase):
+    def test_tokens_of_subclass_with_other_lexer(self):
+        class TextCode(PythonCode):
+            lexer_cls = TextLexer
+
+        document = Document('a = 1')
+        tokens = PythonCode(document, {}, {})._get_tokens()
+        text_tokens = TextCode(document, {}, {})._get_tokens()
+
+        self.assertNotEqual(tokens, text_tokens)
+        self.assertEqual(text_tokens, TextCode(document, {}, {})._get_tokens())
+
+
+from prompt_toolkit.contrib.repl import PythonCommandLine
+
+import sys
+
+class PythonCommandLineTest(unittest.TestCase):
+    def setUp(self):
+        self.cli = PythonCommandLine(stdin=sys.stdin, stdout=six.StringIO())
+
+    def execute(self, line):
+        """ Run `_execute` and return what it printed. """
+        stdout = sys.stdout
+        sys.stdout = six.StringIO()
+        try:
+            self.cli._execute(line)
+            return sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+    def test_expression(self):
+        self.assertEqual(self.execute('1 + 1'), 'Out[1]: 2\n\n')
+        self.assertEqual(self.cli.locals['_'], 2)
+        self.assertEqual(self.cli.locals['_1'], 2)
+
+        # `None` is not displayed.
+        self.assertEqual(self.execute('None'), '\n')
+
+    def test_statement(self):
+        self.assertEqual(self.execute('a = 3'), '\n')
+        self.assertEqual(self.cli.locals['a'], 3)
+        self.assertNotIn('_', self.cli.locals)
+
+    def test_expression_followed_by_statement(self):
+        self.cli.locals['a'] = 3
+
+        # Executed as a whole. Nothing is displayed.
+        self.assertEqual(self.execute('a\nb = a * 2'), '\n')
+        self.assertEqual(self.cli.locals['b'], 6)
+        self.assertNotIn('_', self.cli.locals)
+
+    def test_syntax_error(self):
+        stdout = sys.stdout
+        sys.stdout = six.StringIO()
+        try:
+            try:
+                self.cli._execute('1 +')
+            except SyntaxError as e:
+                self.cli._handle_exception(e)
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+        self.assertIn('Traceback', output)
+        self.assertIn('SyntaxError', output)
+        self.assertIn('<input>', output)
+
+
 #class VariableTest(unittest.TestCase):
 #    def setUp(self):
 #        self.variable = Variable(placeholder='my-variable', dest='destination')